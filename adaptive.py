@@ -0,0 +1,172 @@
+"""약한 키/바이그램 기반 단어 추천
+
+단어유형마다 (단어 x 특징) 행렬을 한 번 만들어 두고, 사용자의 약점 벡터와의
+내적 한 번으로 모든 후보 단어의 점수를 계산한다. 특징은 a~z 글자 27개(기타 포함)와
+해시한 바이그램 버킷이며, 행마다 합이 1이 되도록 정규화해 긴 단어가 유리하지 않게 한다.
+약점 벡터는 KeystrokeStat(바이그램별 지연/오타)에서 계산해 사용자별로 잠시 캐시한다.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from models import KeystrokeStat
+
+# numpy는 행렬/약점 벡터를 처음 만들 때 import (앱을 불러오기만 하는 CLI 명령 등의 시작 시간 단축)
+np = None
+
+ADAPTIVE_PROFILE_TTL = float(os.environ.get('ADAPTIVE_PROFILE_TTL', 60))
+ADAPTIVE_PROFILE_CACHE_SIZE = int(os.environ.get('ADAPTIVE_PROFILE_CACHE_SIZE', 10000))
+ADAPTIVE_MIN_KEYSTROKES = int(os.environ.get('ADAPTIVE_MIN_KEYSTROKES', 50))
+ADAPTIVE_DRILL_RATIO = float(os.environ.get('ADAPTIVE_DRILL_RATIO', 0.5))
+
+LETTER_FEATURES = 27  # a~z + 기타
+BIGRAM_BUCKETS = 256
+FEATURE_SIZE = LETTER_FEATURES + BIGRAM_BUCKETS
+
+# 오타율 1.0이 평균 대비 지연 몇 배와 같은 약점인지
+ERROR_WEIGHT = 3.0
+# 관측 수가 이 정도 되어야 약점을 절반 정도 신뢰
+CONFIDENCE_COUNT = 10
+# 점수 상위 (k x 이 값)개 중에서 무작위로 골라 매번 같은 단어만 나오지 않게 함
+CANDIDATE_FACTOR = 5
+
+
+def _import_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+def letter_feature(char):
+    if 'a' <= char <= 'z':
+        return ord(char) - ord('a')
+    return LETTER_FEATURES - 1
+
+
+def bigram_feature(bigram):
+    # 프로세스마다 달라지는 hash() 대신 고정된 해시 사용
+    return LETTER_FEATURES + (ord(bigram[0]) * 31 + ord(bigram[1])) % BIGRAM_BUCKETS
+
+
+def feature_indexes(text):
+    """단어 하나에 나타나는 특징 인덱스 목록 (중복 포함)"""
+    text = text.lower()
+    indexes = [letter_feature(char) for char in text]
+    indexes.extend(bigram_feature(a + b) for a, b in zip(text, text[1:]))
+    return indexes
+
+
+class WordFeatureMatrix:
+    """단어유형 하나의 단어 목록과 특징 행렬"""
+
+    def __init__(self, words):
+        _import_numpy()
+        self.words = words
+        rows = []
+        cols = []
+        for row, word in enumerate(words):
+            indexes = feature_indexes(word)
+            rows.extend([row] * len(indexes))
+            cols.extend(indexes)
+        self.matrix = np.zeros((len(words), FEATURE_SIZE), dtype=np.float32)
+        np.add.at(self.matrix, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), 1)
+        totals = self.matrix.sum(axis=1, keepdims=True)
+        np.divide(self.matrix, totals, out=self.matrix, where=totals > 0)
+
+    def select(self, weakness, k, rng):
+        """약점 벡터와 많이 겹치는 단어 k개"""
+        n = len(self.words)
+        if n == 0:
+            return []
+        k = min(k, n)
+        scores = self.matrix @ weakness
+        pool_size = min(n, k * CANDIDATE_FACTOR)
+        if pool_size < n:
+            pool = np.argpartition(-scores, pool_size - 1)[:pool_size]
+        else:
+            pool = np.arange(n)
+        chosen = rng.choice(pool, size=k, replace=False)
+        return [self.words[i] for i in chosen]
+
+
+def weakness_vector(stats):
+    """KeystrokeStat 행들로 약점 벡터 계산 (관측이 부족하면 None)"""
+    total_count = sum(stat.count for stat in stats)
+    if total_count < ADAPTIVE_MIN_KEYSTROKES:
+        return None
+
+    _import_numpy()
+    mean_latency = sum(stat.latency_total for stat in stats) / total_count
+    vector = np.zeros(FEATURE_SIZE, dtype=np.float32)
+    for stat in stats:
+        if len(stat.bigram) != 2 or stat.count <= 0:
+            continue
+        # 지연이 모두 0이면(바이너리 업로드에서 가능) 느림 항은 빼고 오타만 반영
+        slowness = max(0.0, stat.latency_total / stat.count / mean_latency - 1.0) if mean_latency > 0 else 0.0
+        badness = slowness + ERROR_WEIGHT * stat.errors / stat.count
+        weight = badness * stat.count / (stat.count + CONFIDENCE_COUNT)
+        vector[bigram_feature(stat.bigram)] += weight
+        # 두 번째 글자를 누를 때 걸린 시간이므로 글자 약점은 두 번째 글자에 반영
+        vector[letter_feature(stat.bigram[1])] += weight
+
+    if not vector.any():
+        return None
+    return vector / np.linalg.norm(vector)
+
+
+class AdaptiveSelector:
+    """사용자 약점에 맞춘 연습 단어 선택"""
+
+    def __init__(self, corpus, profile_ttl=ADAPTIVE_PROFILE_TTL, cache_size=ADAPTIVE_PROFILE_CACHE_SIZE):
+        self.corpus = corpus
+        self.profile_ttl = profile_ttl
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._matrices = {}
+        self._matrix_version = None
+        self._profiles = OrderedDict()
+        self._rng = None
+
+    def _matrix(self, word_type):
+        # 코퍼스가 교체되면 행렬을 다시 만듦
+        if self._matrix_version != self.corpus.version:
+            with self._lock:
+                if self._matrix_version != self.corpus.version:
+                    self._matrices = {}
+                    self._matrix_version = self.corpus.version
+        matrix = self._matrices.get(word_type)
+        if matrix is None:
+            matrix = WordFeatureMatrix(self.corpus.words(word_type))
+            self._matrices[word_type] = matrix
+        return matrix
+
+    def warm(self):
+        """모든 단어유형의 특징 행렬을 미리 생성"""
+        for word_type in self.corpus.word_types():
+            self._matrix(word_type)
+
+    def profile(self, user_id):
+        """사용자 약점 벡터 (캐시, 데이터가 부족하면 None). 앱 컨텍스트 안에서 호출"""
+        now = time.monotonic()
+        cached = self._profiles.get(user_id)
+        if cached is not None and now - cached[0] < self.profile_ttl:
+            return cached[1]
+
+        vector = weakness_vector(KeystrokeStat.query.filter_by(user_id=user_id).all())
+        with self._lock:
+            self._profiles[user_id] = (now, vector)
+            self._profiles.move_to_end(user_id)
+            while len(self._profiles) > self.cache_size:
+                self._profiles.popitem(last=False)
+        return vector
+
+    def select(self, user_id, word_type, k):
+        """약점 기반 단어 k개 (약점 데이터가 없으면 None)"""
+        weakness = self.profile(user_id)
+        if weakness is None:
+            return None
+        if self._rng is None:
+            self._rng = np.random.default_rng()
+        return self._matrix(word_type).select(weakness, k, self._rng)
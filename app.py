@@ -1,18 +1,38 @@
+import time
+_import_started = time.perf_counter()  # 시작 시간 보고용 (다른 import보다 먼저 기록)
+
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
-from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
+import click
 import json
 import random
 
+from sqlalchemy.exc import IntegrityError
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from adaptive import ADAPTIVE_DRILL_RATIO, AdaptiveSelector
+import archive
+from auth import AuthBusyError, AuthRateLimiter, PasswordHasher, RateLimitedError
+from corpus import CORPUS_SOURCE_DIR, CorpusStore, build_corpus
+from db_config import configure_database, report_engine_settings
+from ingest import (INGEST_BATCH_MAX_RESULTS, QueueFullError, ResultIngestor, ValidationError, prune_result_keys,
+                    seen_result_keys, validate_batch_item, validate_result)
+from leaderboard import Leaderboard
+from metrics import METRICS_TOKEN, PROFILER_MAX_SECONDS, PROFILER_TOKEN, RequestMetrics, token_allowed
+from models import db, User, GameSession, ensure_indexes
+from startup import StartupReport, configure_template_cache, precompile_templates
+import stats
+from telemetry import TELEMETRY_MAX_BYTES, KeystrokeAggregator, TelemetryError, decode_keystrokes, user_key_stats
+from word_bundles import WordBundleStore, make_bundle_response
+
 app = Flask(__name__)
+configure_template_cache(app)
 
 # 환경 변수에서 설정 로드
 import os
 
-# data 디렉토리 생성
+# data 디렉토리 (DB, 코퍼스, 스풀 파일은 처음 쓸 때 디렉토리를 만듦)
 data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
-os.makedirs(data_dir, exist_ok=True)
 
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 
@@ -21,38 +41,45 @@ default_db_path = f"sqlite:///{os.path.join(data_dir, 'typing_practice.db')}"
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', default_db_path)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+# nginx 등 프록시 뒤에서 실행할 때 클라이언트 IP를 X-Forwarded-For에서 읽음 (프록시 단계 수)
+trusted_proxy_count = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+if trusted_proxy_count:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted_proxy_count, x_proto=trusted_proxy_count)
+
+configure_database(app)
+db.init_app(app)
+
+# 비밀번호 해시 프로세스 풀과 로그인/회원가입 요청 한도
+password_hasher = PasswordHasher()
+auth_limiter = AuthRateLimiter()
+
+# 스테이지 결과 수집기 (검증 후 큐에 넣고 백그라운드에서 일괄 저장)
+result_ingestor = ResultIngestor(app, spool_dir=os.environ.get('INGEST_SPOOL_DIR', os.path.join(data_dir, 'spool')))
+result_ingestor.add_batch_hook(stats.apply_results)
+
+# 키 입력 텔레메트리 집계기 (바이그램별 고정 크기 히스토그램만 저장)
+keystroke_aggregator = KeystrokeAggregator(app)
+
+# 요청 계측 (/metrics)
+request_metrics = RequestMetrics(app)
+request_metrics.gauge('typing_ingest_queue_depth', '저장 대기 중인 스테이지 결과 수', result_ingestor.depth)
+request_metrics.gauge('typing_ingest_rows_written', '저장한 스테이지 결과 수', lambda: result_ingestor.rows_written)
+request_metrics.gauge('typing_ingest_rows_dropped', '저장에 실패해 버린 스테이지 결과 수', lambda: result_ingestor.rows_dropped)
+request_metrics.gauge('typing_ingest_rows_failed', '저장에 실패해 failed-*.log로 옮긴 스테이지 결과 수', lambda: result_ingestor.rows_failed)
+request_metrics.gauge('typing_auth_pending_hashes', '계산 중이거나 대기 중인 비밀번호 해시 수', password_hasher.pending)
+request_metrics.gauge('typing_auth_rejected', '해시 대기열이 가득 차 거절한 요청 수', lambda: password_hasher.rejected)
+request_metrics.gauge('typing_auth_rate_limited', '요청 한도를 넘어 거절한 요청 수', lambda: auth_limiter.limited)
+request_metrics.gauge('typing_telemetry_pending_bigrams', 'DB 병합 대기 중인 바이그램 누적치 수', keystroke_aggregator.pending_count)
+
+# 시작 단계별 소요 시간과 워커별 첫 요청 시간 출력
+startup_report = StartupReport(_import_started)
+startup_report.watch_first_request(app)
 
 # 템플릿에서 사용할 함수들 등록
 @app.context_processor
 def utility_processor():
     return dict(now=datetime.utcnow)
 
-# 데이터베이스 모델
-class User(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(255), nullable=False)
-    current_stage = db.Column(db.Integer, default=1)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-    
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-
-class GameSession(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    stage = db.Column(db.Integer, nullable=False)
-    score = db.Column(db.Integer, default=0)
-    accuracy = db.Column(db.Float, default=0.0)
-    words_completed = db.Column(db.Integer, default=0)
-    words_missed = db.Column(db.Integer, default=0)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-
 # 단계별 게임 설정
 STAGE_CONFIG = {
     # 초보 단계 (2배로 확장, 더 느린 속도)
@@ -92,169 +119,23 @@ STAGE_CONFIG = {
     24: {'speed': 400, 'word_count': 6, 'word_type': 'complex'},
 }
 
-# 단어/문장 데이터
-WORDS_DATA = {
-    'single': [
-        # 기본 단어들
-        'the', 'and', 'for', 'you', 'all', 'not', 'but', 'can', 'had', 'her',
-        'was', 'one', 'our', 'out', 'day', 'get', 'has', 'him', 'his', 'how',
-        'man', 'new', 'now', 'old', 'see', 'two', 'who', 'boy', 'did', 'its',
-        'let', 'put', 'say', 'she', 'too', 'use', 'way', 'may', 'come', 'call',
-        
-        # 추가된 다양한 단어들
-        'time', 'work', 'life', 'right', 'down', 'very', 'what', 'just', 'first',
-        'over', 'think', 'also', 'back', 'after', 'good', 'want', 'through', 'many',
-        'where', 'much', 'should', 'well', 'people', 'down', 'own', 'just', 'because',
-        'good', 'each', 'those', 'feel', 'seem', 'these', 'free', 'little', 'human',
-        'local', 'large', 'next', 'available', 'major', 'possible', 'big', 'able',
-        'economic', 'argue', 'far', 'successful', 'exactly', 'step', 'discuss', 'topic',
-        
-        # 흥미로운 단어들
-        'amazing', 'beautiful', 'creative', 'delicious', 'exciting', 'fantastic', 'gorgeous',
-        'happiness', 'incredible', 'joyful', 'kindness', 'laughter', 'magnificent', 'nature',
-        'optimistic', 'peaceful', 'quality', 'relaxing', 'sunshine', 'tremendous', 'unique',
-        'victory', 'wonderful', 'excellent', 'youth', 'zealous', 'adventure', 'brilliant',
-        'courage', 'dream', 'energy', 'freedom', 'growth', 'harmony', 'inspire', 'journey',
-        
-        # 기본 동사들
-        'run', 'walk', 'talk', 'read', 'write', 'play', 'make', 'take', 'give', 'know',
-        'find', 'turn', 'move', 'live', 'show', 'hear', 'look', 'ask', 'try', 'need',
-        'feel', 'become', 'leave', 'bring', 'keep', 'start', 'stop', 'help', 'open', 'close',
-        'build', 'break', 'learn', 'teach', 'understand', 'remember', 'forget', 'choose', 'decide', 'change',
-        
-        # 일상 명사들
-        'house', 'car', 'book', 'computer', 'phone', 'table', 'chair', 'door', 'window', 'food',
-        'water', 'money', 'friend', 'family', 'school', 'office', 'city', 'country', 'world', 'earth',
-        'sun', 'moon', 'star', 'tree', 'flower', 'animal', 'dog', 'cat', 'bird', 'fish',
-        'music', 'movie', 'game', 'sport', 'color', 'number', 'letter', 'word', 'story', 'picture',
-        
-        # 형용사들
-        'big', 'small', 'long', 'short', 'high', 'low', 'fast', 'slow', 'hot', 'cold',
-        'warm', 'cool', 'bright', 'dark', 'light', 'heavy', 'easy', 'hard', 'soft', 'rough',
-        'smooth', 'clean', 'dirty', 'fresh', 'old', 'young', 'strong', 'weak', 'rich', 'poor',
-        'happy', 'sad', 'angry', 'calm', 'busy', 'free', 'safe', 'dangerous', 'healthy', 'sick',
-        
-        # 기술 관련 단어들
-        'internet', 'website', 'email', 'software', 'hardware', 'digital', 'online', 'data', 'file', 'folder',
-        'program', 'system', 'network', 'server', 'database', 'password', 'username', 'download', 'upload', 'backup',
-        'keyboard', 'mouse', 'screen', 'monitor', 'printer', 'scanner', 'camera', 'video', 'audio', 'image',
-        
-        # 학습 관련 단어들
-        'student', 'teacher', 'lesson', 'homework', 'test', 'exam', 'grade', 'class', 'subject', 'course',
-        'university', 'college', 'degree', 'certificate', 'skill', 'knowledge', 'education', 'training', 'practice', 'study',
-        'research', 'project', 'assignment', 'presentation', 'report', 'paper', 'article', 'journal', 'library', 'textbook',
-        
-        # 감정 및 상태 단어들
-        'love', 'hope', 'fear', 'joy', 'peace', 'stress', 'worry', 'confidence', 'pride', 'shame',
-        'surprise', 'excitement', 'boredom', 'interest', 'curiosity', 'patience', 'gratitude', 'respect', 'trust', 'faith',
-        'memory', 'thought', 'idea', 'opinion', 'belief', 'value', 'goal', 'plan', 'purpose', 'meaning',
-        
-        # 액션 및 활동 단어들
-        'exercise', 'cooking', 'shopping', 'travel', 'vacation', 'holiday', 'party', 'meeting', 'conference', 'interview',
-        'conversation', 'discussion', 'argument', 'agreement', 'decision', 'choice', 'option', 'solution', 'problem', 'question',
-        'answer', 'result', 'effect', 'cause', 'reason', 'explanation', 'example', 'experience', 'opportunity', 'challenge'
-    ],
-    'short': [
-        # 기본 짧은 구문들
-        'hello world', 'good morning', 'how are you', 'nice to meet', 'thank you',
-        'see you later', 'have a day', 'what is this', 'where are you', 'when will you',
-        'why do you', 'how do you', 'can you help', 'I am fine', 'this is good', 'that was nice',
-        
-        # 일상 대화
-        'how was work', 'see you soon', 'take care now', 'what time is it', 'where shall we go',
-        'let me think', 'that sounds great', 'I understand now', 'no problem at all', 'you are welcome',
-        'excuse me please', 'I beg your pardon', 'could you repeat', 'nice weather today', 'have fun tonight',
-        
-        # 감정 표현
-        'I feel happy', 'this is awesome', 'what a surprise', 'I am excited', 'that was funny',
-        'so proud of you', 'well done today', 'keep up the work', 'never give up', 'dream big always',
-        
-        # 학습/업무 관련
-        'let me check', 'good idea indeed', 'time to learn', 'work hard today', 'study well tonight',
-        'practice makes perfect', 'knowledge is power', 'creativity flows freely', 'innovation drives progress', 'teamwork builds success'
-    ],
-    'medium': [
-        # 기존 문장들
-        'The quick brown fox jumps over the lazy dog',
-        'Practice makes perfect in everything you do',
-        'Learning to type fast requires daily practice',
-        'Technology advances at an incredible pace today',
-        'Communication skills are essential for success',
-        'The internet connects people around the world',
-        'Programming languages help solve complex problems',
-        'Education opens doors to many opportunities',
-        
-        # 생활과 일상
-        'Coffee shops provide a cozy atmosphere for reading and relaxation',
-        'Regular exercise contributes significantly to maintaining good health and wellness',
-        'Cooking homemade meals brings families together around the dinner table',
-        'Reading books expands vocabulary and improves critical thinking skills dramatically',
-        'Gardening teaches patience while connecting us with the natural world',
-        'Music has the power to evoke emotions and create lasting memories',
-        'Travel broadens perspectives and introduces us to diverse cultures worldwide',
-        
-        # 기술과 혁신
-        'Smartphones have revolutionized the way we communicate and access information',
-        'Social media platforms connect billions of people across different continents',
-        'Renewable energy sources are becoming increasingly important for environmental sustainability',
-        'Virtual reality technology creates immersive experiences for entertainment and education',
-        'Machine learning algorithms can analyze vast amounts of data efficiently',
-        
-        # 자기계발과 성장
-        'Setting clear goals helps maintain focus and direction in life',
-        'Developing emotional intelligence improves relationships and career prospects significantly',
-        'Time management skills enable better work-life balance and increased productivity',
-        'Continuous learning keeps the mind sharp and adaptable to change',
-        'Building strong networks opens doors to new opportunities and collaborations'
-    ],
-    'long': [
-        # 기존 긴 문장들
-        'In the heart of every great achievement lies a story of perseverance and dedication',
-        'The advancement of artificial intelligence continues to reshape our understanding of technology',
-        'Effective communication involves not just speaking clearly but also listening attentively',
-        'The pursuit of knowledge requires patience, curiosity, and an open mind to new ideas',
-        'Success in any field demands continuous learning and adaptation to changing circumstances',
-        
-        # 철학적이고 깊이 있는 문장들
-        'The greatest discoveries often emerge from the intersection of different fields of knowledge and expertise',
-        'Creativity flourishes when we embrace uncertainty and allow ourselves to explore unconventional paths',
-        'Building meaningful relationships requires genuine interest in others and the ability to empathize deeply',
-        'Environmental conservation demands collective action and individual responsibility from every global citizen',
-        'Innovation thrives in environments that encourage experimentation and learn from both success and failure',
-        
-        # 사회와 문화
-        'Cultural diversity enriches our understanding of human experience and promotes tolerance across communities',
-        'Digital transformation has fundamentally altered how businesses operate and customers interact with brands',
-        'Sustainable development balances economic growth with environmental protection and social equity considerations',
-        'Educational systems must evolve to prepare students for careers that may not yet exist',
-        'Leadership in the modern world requires adaptability, emotional intelligence, and ethical decision-making skills',
-        
-        # 과학과 미래
-        'Scientific research continues to unlock mysteries about the universe and our place within it',
-        'Climate change represents one of the most pressing challenges facing humanity in this century',
-        'Biotechnology advances offer promising solutions for treating previously incurable diseases and conditions',
-        'Space exploration expands our knowledge while inspiring future generations to pursue ambitious goals'
-    ],
-    'complex': [
-        # 기존 복잡한 문장들
-        'Despite the complexity of modern technological systems, human creativity remains the driving force behind innovation',
-        'The interdisciplinary approach to problem-solving often yields the most comprehensive and sustainable solutions',
-        'Globalization has fundamentally transformed the way we conduct business, communicate, and share cultural experiences',
-        'The synthesis of theoretical knowledge and practical application forms the foundation of meaningful scientific progress',
-        
-        # 매우 복잡하고 도전적인 문장들
-        'The convergence of artificial intelligence, quantum computing, and biotechnology promises to revolutionize industries while simultaneously raising profound ethical questions about privacy, autonomy, and human identity',
-        'Contemporary neuroscience research has revealed that neuroplasticity allows the brain to reorganize itself throughout life, challenging long-held assumptions about cognitive development and rehabilitation possibilities',
-        'The transition toward renewable energy infrastructure requires coordinated efforts among governments, private sector entities, and international organizations to overcome technical, economic, and political obstacles',
-        'Philosophical debates about consciousness, free will, and moral responsibility continue to evolve as cognitive science provides new insights into the mechanisms underlying human behavior and decision-making processes',
-        
-        # 학술적이고 전문적인 문장들
-        'Quantum mechanical principles demonstrate that observation fundamentally alters the behavior of subatomic particles, suggesting reality itself may be more fluid than classical physics previously indicated',
-        'Epidemiological studies require careful consideration of confounding variables, selection bias, and statistical power to draw valid conclusions about causal relationships between exposure and disease outcomes',
-        'Macroeconomic policy decisions involving fiscal and monetary instruments must balance competing objectives such as inflation control, employment maximization, and sustainable long-term economic growth',
-        'Postmodern literary criticism challenges traditional notions of authorial intent and textual meaning, emphasizing instead the role of reader interpretation and cultural context in creating significance'
-    ]
-}
+# 단어 코퍼스 (corpus/ 원본을 인덱스 파일로 빌드해 읽기 전용으로 조회, create_app() 또는 처음 쓸 때 빌드/열기)
+corpus_path = os.environ.get('CORPUS_PATH', os.path.join(data_dir, 'corpus.sqlite'))
+corpus = CorpusStore(corpus_path, lang=os.environ.get('CORPUS_LANG', 'en'))
+
+# 단계별/전체 리더보드 (메모리 정렬 배열, REDIS_URL이 있으면 Redis에도 반영)
+leaderboard = Leaderboard(STAGE_CONFIG)
+
+# 단계별 단어 번들 (처음 쓸 때(또는 create_app()에서) 한 번 직렬화/압축)
+word_bundles = WordBundleStore(STAGE_CONFIG, corpus)
+
+# 약한 바이그램 기반 연습 단어 추천
+adaptive_selector = AdaptiveSelector(corpus)
+
+MAX_STAGE = max(STAGE_CONFIG)
+# (script_root, 진행 단계) -> 대시보드 단계 칸 목록 (create_app()에서 미리 만들 수 있음)
+stage_grids = {}
+DASHBOARD_PRECOMPUTE_GRID = os.environ.get('DASHBOARD_PRECOMPUTE_GRID', 'true').lower() == 'true'
 
 # 라우트 정의
 @app.route('/')
@@ -266,21 +147,30 @@ def index():
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
-        data = request.get_json()
-        username = data.get('username')
-        email = data.get('email')
-        password = data.get('password')
+        data = request.get_json(silent=True)
+        username, email, password = auth_fields(data, 'username', 'email', 'password')
         
-        if User.query.filter_by(username=username).first():
-            return jsonify({'success': False, 'message': '이미 존재하는 사용자명입니다.'})
+        if not username or not email or not password:
+            return jsonify({'success': False, 'message': '모든 항목을 입력해주세요.'})
         
-        if User.query.filter_by(email=email).first():
-            return jsonify({'success': False, 'message': '이미 등록된 이메일입니다.'})
+        try:
+            auth_limiter.check(request.remote_addr)
+            password_hash = password_hasher.hash(password)
+        except RateLimitedError as e:
+            return auth_error_response(str(e), 429, e.retry_after)
+        except AuthBusyError as e:
+            return auth_error_response(str(e), 503, 1)
         
-        user = User(username=username, email=email)
-        user.set_password(password)
+        # 중복 확인은 미리 조회하지 않고 UNIQUE 제약에 맡김
+        user = User(username=username, email=email, password_hash=password_hash)
         db.session.add(user)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if User.query.filter_by(username=username).first():
+                return jsonify({'success': False, 'message': '이미 존재하는 사용자명입니다.'})
+            return jsonify({'success': False, 'message': '이미 등록된 이메일입니다.'})
         
         return jsonify({'success': True, 'message': '회원가입이 완료되었습니다.'})
     
@@ -289,12 +179,27 @@ def register():
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
-        data = request.get_json()
-        username = data.get('username')
-        password = data.get('password')
+        data = request.get_json(silent=True)
+        username, password = auth_fields(data, 'username', 'password')
+        
+        try:
+            auth_limiter.check(request.remote_addr, username)
+        except RateLimitedError as e:
+            return auth_error_response(str(e), 429, e.retry_after)
+        
+        user = User.query.with_entities(User.id, User.username, User.password_hash).filter_by(username=username).first()
+        # 해시를 계산하는 동안 DB 연결을 잡고 있지 않도록 반납
+        db.session.close()
+        try:
+            verified, new_hash = password_hasher.verify(user.password_hash, password) if user and password else (False, None)
+        except AuthBusyError as e:
+            return auth_error_response(str(e), 503, 1)
         
-        user = User.query.filter_by(username=username).first()
-        if user and user.check_password(password):
+        if verified:
+            if new_hash:
+                # 해시 방식/반복 횟수가 바뀌었으면 새 설정으로 교체
+                User.query.filter_by(id=user.id).update({'password_hash': new_hash})
+                db.session.commit()
             session['user_id'] = user.id
             session['username'] = user.username
             return jsonify({'success': True, 'message': '로그인 성공!'})
@@ -303,6 +208,17 @@ def login():
     
     return render_template('login.html')
 
+def auth_fields(data, *names):
+    # 문자열이 아닌 값(숫자, 목록 등)은 입력하지 않은 것으로 처리
+    if not isinstance(data, dict):
+        return (None,) * len(names)
+    return tuple(data.get(name) if isinstance(data.get(name), str) else None for name in names)
+
+def auth_error_response(message, status, retry_after):
+    response = jsonify({'success': False, 'message': message})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, status
+
 @app.route('/logout')
 def logout():
     session.clear()
@@ -314,7 +230,27 @@ def dashboard():
         return redirect(url_for('login'))
     
     user = User.query.get(session['user_id'])
-    return render_template('dashboard.html', user=user, max_stage=24)
+    stage_stats = stats.user_stage_stats(user.id)
+    return render_template('dashboard.html', user=user, max_stage=MAX_STAGE, stage_stats=stage_stats,
+                           stage_grid=dashboard_stage_grid(user.current_stage))
+
+def dashboard_stage_grid(current_stage):
+    """대시보드 단계 선택 칸 목록 (진행 단계별로 한 번만 만들고 재사용)"""
+    # url_for 결과는 마운트 위치(SCRIPT_NAME)에 따라 다르므로 같이 키로 씀
+    key = (request.script_root, current_stage)
+    grid = stage_grids.get(key)
+    if grid is None:
+        grid = tuple(
+            {
+                'stage': stage,
+                'status': 'done' if stage < current_stage else 'current' if stage == current_stage else 'locked',
+                'game_url': url_for('game', stage=stage),
+                'race_url': url_for('race', stage=stage),
+            }
+            for stage in range(1, MAX_STAGE + 1)
+        )
+        stage_grids[key] = grid
+    return grid
 
 @app.route('/game/<int:stage>')
 def game(stage):
@@ -331,54 +267,269 @@ def game(stage):
         return redirect(url_for('dashboard'))
     
     config = STAGE_CONFIG[stage]
-    return render_template('game.html', stage=stage, config=config)
+    word_bundles.refresh()
+    bundles = word_bundles.manifest(stage)
+    # 일부 게임은 약점 맞춤 단어로 (나머지는 캐시 가능한 번들 사용)
+    adaptive = random.random() < ADAPTIVE_DRILL_RATIO and adaptive_selector.profile(user.id) is not None
+    return render_template('game.html', stage=stage, config=config, bundles=bundles, adaptive=adaptive)
+
+@app.route('/race/<int:stage>')
+def race(stage):
+    if 'user_id' not in session:
+        return redirect(url_for('login'))
+    
+    user = User.query.get(session['user_id'])
+    if stage > user.current_stage:
+        flash('이전 단계를 먼저 완료해주세요.')
+        return redirect(url_for('dashboard'))
+    
+    if stage not in STAGE_CONFIG:
+        flash('유효하지 않은 단계입니다.')
+        return redirect(url_for('dashboard'))
+    
+    # 레이스 WebSocket 서버 주소 (비어 있으면 같은 호스트의 /ws/race, nginx가 race.py로 전달)
+    race_url = os.environ.get('RACE_WS_URL', '')
+    return render_template('race.html', stage=stage, config=STAGE_CONFIG[stage], race_url=race_url)
 
 @app.route('/api/words/<int:stage>')
 def get_words(stage):
     if stage not in STAGE_CONFIG:
         return jsonify({'error': 'Invalid stage'})
     
+    word_bundles.refresh()
+    # 미리 만들어 둔 번들 중 하나를 무작위로 제공 (응답마다 내용이 달라 캐시하지 않음)
+    return make_bundle_response(word_bundles.random_bundle(stage), cacheable=False)
+
+@app.route('/api/words/<int:stage>/drill')
+def get_drill_words(stage):
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not logged in'})
+    
+    if stage not in STAGE_CONFIG:
+        return jsonify({'error': 'Invalid stage'})
+    
     config = STAGE_CONFIG[stage]
-    word_type = config['word_type']
-    words = random.sample(WORDS_DATA[word_type], min(len(WORDS_DATA[word_type]), 10))
+    word_bundles.refresh()
+    words = adaptive_selector.select(session['user_id'], config['word_type'], word_bundles.bundle_size)
+    if words is None:
+        # 약점 데이터가 아직 없으면 일반 번들로 대체
+        return make_bundle_response(word_bundles.random_bundle(stage), cacheable=False)
     
-    return jsonify({
-        'words': words,
-        'config': config
-    })
+    response = jsonify({'words': words, 'config': config, 'adaptive': True})
+    response.cache_control.private = True
+    response.cache_control.no_store = True
+    return response
+
+@app.route('/api/words/<int:stage>/bundles')
+def get_word_bundle_manifest(stage):
+    if stage not in STAGE_CONFIG:
+        return jsonify({'error': 'Invalid stage'}), 404
+    
+    word_bundles.refresh()
+    response = jsonify(word_bundles.manifest(stage))
+    response.cache_control.public = True
+    response.cache_control.max_age = 60
+    return response
+
+@app.route('/api/words/<int:stage>/bundle/<int:bundle_id>')
+def get_word_bundle(stage, bundle_id):
+    word_bundles.refresh()
+    bundle = word_bundles.get(stage, bundle_id)
+    if bundle is None:
+        return jsonify({'error': 'Invalid bundle'}), 404
+    
+    # ?v=가 지금 버전과 같을 때만 오래 캐시 (코퍼스가 바뀐 뒤 옛 버전 URL에 새 내용이 캐시되지 않도록)
+    return make_bundle_response(bundle, cacheable=request.args.get('v') == word_bundles.version)
 
 @app.route('/api/complete-stage', methods=['POST'])
 def complete_stage():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Not logged in'})
     
-    data = request.get_json()
-    stage = data.get('stage')
-    score = data.get('score', 0)
-    accuracy = data.get('accuracy', 0.0)
-    words_completed = data.get('words_completed', 0)
-    words_missed = data.get('words_missed', 0)
+    try:
+        result = validate_result(request.get_json(silent=True), STAGE_CONFIG)
+    except ValidationError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    user = User.query.get(session['user_id'])
+    stage = result['stage']
+    
+    # 게임 세션은 수집 큐에 넣고 백그라운드에서 일괄 저장
+    try:
+        result_ingestor.submit(user.id, result)
+    except QueueFullError as e:
+        response = jsonify({'success': False, 'message': str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
+    leaderboard.record(user.id, stage, result['score'], result['accuracy'], username=user.username)
+    unlock_next_stage(user, stage)
+    
+    return jsonify({'success': True, 'next_stage': user.current_stage})
+
+@app.route('/api/complete-stages', methods=['POST'])
+def complete_stages():
+    # 오프라인 큐(static/js/offline.js)에 쌓인 결과를 한 번에 저장. 결과마다 붙은 id로 중복 저장을 막음
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not logged in'})
+    
+    data = request.get_json(silent=True)
+    items = data.get('results') if isinstance(data, dict) else None
+    if not isinstance(items, list) or len(items) > INGEST_BATCH_MAX_RESULTS:
+        return jsonify({'success': False, 'message': f'결과는 최대 {INGEST_BATCH_MAX_RESULTS}개씩 보낼 수 있습니다.'}), 400
+    
+    valid, rejected = [], []
+    for item in items:
+        # 같은 브라우저를 쓴 다른 사용자의 결과는 건드리지 않음 (그 사용자가 로그인하면 전송됨)
+        if isinstance(item, dict) and item.get('user_id') not in (None, session['user_id']):
+            continue
+        try:
+            valid.append(validate_batch_item(item, STAGE_CONFIG))
+        except ValidationError as e:
+            rejected.append({'id': item.get('id') if isinstance(item, dict) else None, 'message': str(e)})
     
     user = User.query.get(session['user_id'])
+    # 키는 저장 트랜잭션에서 기록하므로 여기서는 이미 저장된 것만 골라 응답 (동시에 보낸 중복은 저장할 때 걸러짐)
+    seen = seen_result_keys(user.id, [key for key, _, _ in valid])
+    accepted, duplicates = [], []
+    for key, result, played_at in valid:
+        if key in seen:
+            duplicates.append(key)
+            continue
+        try:
+            # 스풀을 쓰면 submit()이 돌아올 때 스풀 파일에 기록된 상태 (그때만 accepted로 응답)
+            result_ingestor.submit(user.id, result, created_at=played_at, key=key)
+        except QueueFullError as e:
+            # 나머지는 accepted에 넣지 않으므로 클라이언트가 나중에 다시 보냄
+            response = jsonify({
+                'success': False, 'message': str(e),
+                'accepted': accepted, 'duplicates': duplicates, 'rejected': rejected,
+                'next_stage': user.current_stage
+            })
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        seen.add(key)
+        accepted.append(key)
+        leaderboard.record(user.id, result['stage'], result['score'], result['accuracy'], username=user.username)
+        unlock_next_stage(user, result['stage'])
     
-    # 게임 세션 저장
-    game_session = GameSession(
-        user_id=user.id,
-        stage=stage,
-        score=score,
-        accuracy=accuracy,
-        words_completed=words_completed,
-        words_missed=words_missed
-    )
-    db.session.add(game_session)
-    
-    # 다음 단계 해금
+    return jsonify({
+        'success': True,
+        'accepted': accepted, 'duplicates': duplicates, 'rejected': rejected,
+        'next_stage': user.current_stage
+    })
+
+def unlock_next_stage(user, stage):
+    # 다음 단계 해금 (사용자당 단계 수만큼만 일어나므로 바로 저장)
     if stage == user.current_stage and stage < 20:
         user.current_stage = stage + 1
+        db.session.commit()
+
+@app.route('/api/stats')
+def get_stats():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not logged in'})
     
-    db.session.commit()
+    stage_stats = stats.user_stage_stats(session['user_id'])
+    return jsonify({
+        'success': True,
+        'stages': [stage_stats[stage].to_dict() for stage in sorted(stage_stats)]
+    })
+
+@app.route('/api/history')
+def get_history():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not logged in'})
     
-    return jsonify({'success': True, 'next_stage': user.current_stage})
+    stage = request.args.get('stage', type=int)
+    limit = request.args.get('limit', stats.HISTORY_PAGE_SIZE, type=int)
+    try:
+        sessions, next_cursor = stats.history_page(
+            session['user_id'], stage=stage, limit=limit, cursor=request.args.get('cursor')
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({
+        'success': True,
+        'sessions': [game_session.to_dict() for game_session in sessions],
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/keystrokes', methods=['POST'])
+def upload_keystrokes():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not logged in'})
+    
+    if (request.content_length or 0) > TELEMETRY_MAX_BYTES:
+        return jsonify({'success': False, 'message': '데이터가 너무 큽니다.'}), 413
+    
+    try:
+        stage, events = decode_keystrokes(request.get_data(cache=False))
+    except TelemetryError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if stage not in STAGE_CONFIG:
+        return jsonify({'success': False, 'message': '유효하지 않은 단계입니다.'}), 400
+    
+    summary = keystroke_aggregator.record(session['user_id'], events)
+    return jsonify({'success': True, **summary})
+
+@app.route('/api/keystats')
+def get_key_stats():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Not logged in'})
+    
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify({'success': True, 'bigrams': user_key_stats(session['user_id'], limit=max(1, min(limit, 100)))})
+
+@app.route('/api/leaderboard')
+@app.route('/api/leaderboard/<int:stage>')
+def get_leaderboard(stage=None):
+    if stage is not None and stage not in STAGE_CONFIG:
+        return jsonify({'success': False, 'message': '유효하지 않은 단계입니다.'}), 404
+    
+    limit = request.args.get('limit', 10, type=int)
+    standings = leaderboard.standings(stage=stage, limit=limit, user_id=session.get('user_id'))
+    return jsonify({'success': True, **standings})
+
+@app.route('/sw.js')
+def service_worker():
+    # 서비스 워커는 루트 경로에서 제공해야 사이트 전체를 범위로 가질 수 있음
+    response = app.send_static_file('js/sw.js')
+    response.cache_control.no_cache = True
+    response.cache_control.max_age = 0
+    return response
+
+@app.route('/health')
+def health():
+    # 로드밸런서/도커 헬스체크용 (deep=1이면 DB까지 확인)
+    if request.args.get('deep'):
+        try:
+            db.session.execute(db.text('SELECT 1'))
+        except Exception as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 503
+    return jsonify({'status': 'ok'})
+
+@app.route('/metrics')
+def metrics():
+    if not token_allowed(METRICS_TOKEN):
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+    return request_metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/debug/profile')
+def debug_profile():
+    # PROFILER_TOKEN이 없으면 프로파일러 자체를 노출하지 않음
+    if not PROFILER_TOKEN:
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    if not token_allowed(PROFILER_TOKEN):
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+    
+    seconds = min(request.args.get('seconds', 10, type=float), PROFILER_MAX_SECONDS)
+    stacks = request_metrics.profiler.sample(seconds)
+    if stacks is None:
+        return jsonify({'success': False, 'message': '이미 프로파일링 중입니다.'}), 409
+    return stacks, 200, {'Content-Type': 'text/plain; charset=utf-8'}
 
 def init_database():
     """데이터베이스 초기화"""
@@ -395,16 +546,142 @@ def init_database():
             
             # 테이블 생성
             db.create_all()
+            ensure_indexes()
             print("Database tables created successfully")
             
+            # 통계 테이블이 새로 생긴 경우 기존 기록으로 채우기
+            if not stats.UserStageStats.query.first() and GameSession.query.first():
+                count = stats.rebuild_user_stage_stats()
+                print(f"Rebuilt {count} user stage stats rows")
+            
+            # 리더보드 워밍 (gunicorn preload 시 워커들이 그대로 물려받음)
+            leaderboard.refresh()
+            
+            # 적용된 엔진 설정 확인 (WAL, 커넥션 풀 등)
+            report_engine_settings(db.engine)
+            
     except Exception as e:
         print(f"Error initializing database: {e}")
         print(f"Database URI: {app.config['SQLALCHEMY_DATABASE_URI']}")
         raise
 
+app_ready = False
+
+def create_app(init_db=True):
+    """운영 진입점: 모듈 import 때 미뤄 둔 준비 작업을 끝낸 앱 반환 (여러 번 호출해도 한 번만 실행)
+
+    import 시에는 설정/라우트 등록과 함께 수집기, 코퍼스 등 객체를 만들기만 하고 파일이나
+    프로세스는 건드리지 않는다 (create_app()을 거치지 않는 진입점에서는 처음 쓸 때 준비됨).
+    코퍼스 빌드/열기, DB 초기화, 단어 번들 생성, 맞춤 단어 행렬, 템플릿 컴파일, 대시보드
+    단계 칸은 여기서 만든다. gunicorn preload면 fork 전 마스터에서 한 번 실행되어 워커들이
+    결과를 물려받는다.
+    """
+    global app_ready
+    if app_ready:
+        return app
+    
+    corpus.open()
+    startup_report.mark('corpus')
+    if init_db:
+        init_database()
+        startup_report.mark('init_database')
+    word_bundles.refresh()
+    startup_report.mark('word_bundles')
+    adaptive_selector.warm()
+    startup_report.mark('adaptive')
+    count = precompile_templates(app)
+    startup_report.mark(f'templates({count})')
+    if DASHBOARD_PRECOMPUTE_GRID:
+        with app.test_request_context():
+            for stage in range(1, MAX_STAGE + 1):
+                dashboard_stage_grid(stage)
+        startup_report.mark('dashboard_grid')
+    startup_report.report()
+    app_ready = True
+    return app
+
+@app.cli.command('rebuild-stats')
+def rebuild_stats_command():
+    """게임 기록 전체로 단계별 통계 다시 계산"""
+    count = stats.rebuild_user_stage_stats()
+    print(f"Rebuilt {count} user stage stats rows")
+
+@app.cli.command('build-corpus')
+@click.option('--source', type=click.Path(exists=True, file_okay=False), default=CORPUS_SOURCE_DIR,
+              help='원본 디렉토리 (<언어>/<단어유형>.txt, 기본 CORPUS_SOURCE_DIR)')
+def build_corpus_command(source):
+    """원본 디렉토리로 코퍼스 파일 다시 빌드 (실행 중인 워커는 자동으로 재로드)"""
+    count = build_corpus(corpus_path, source)
+    print(f"Corpus built: {corpus_path} ({count} entries)")
+
+@app.cli.command('export-sessions')
+@click.argument('path')
+@click.option('--table', type=click.Choice(sorted(archive.ARCHIVE_MODELS)), default='sessions', help='내보낼 테이블')
+@click.option('--older-than', type=int, default=None, help='이 일수보다 오래된 세션만 내보내기')
+@click.option('--chunk-size', type=int, default=archive.ARCHIVE_CHUNK_SIZE)
+def export_sessions_command(path, table, older_than, chunk_size):
+    """게임 기록을 .csv.gz 또는 .parquet 파일로 내보내기"""
+    before = archive.retention_cutoff(older_than) if older_than is not None else None
+    try:
+        count = archive.export_table(path, table=table, before=before, chunk_size=chunk_size)
+    except archive.ArchiveError as e:
+        raise click.ClickException(str(e))
+    print(f"Exported {count} {table} rows to {path}")
+
+@app.cli.command('import-sessions')
+@click.argument('path')
+@click.option('--table', type=click.Choice(sorted(archive.ARCHIVE_MODELS)), default='sessions', help='가져올 테이블')
+@click.option('--chunk-size', type=int, default=archive.ARCHIVE_CHUNK_SIZE)
+def import_sessions_command(path, table, chunk_size):
+    """export-sessions로 내보낸 파일 가져오기 (이미 있는 키는 건너뜀, 통계는 다시 계산)
+
+    다른 DB로 옮길 때는 users, sessions, daily 순서로 가져온다.
+    """
+    db.create_all()
+    try:
+        count = archive.import_table(path, table=table, chunk_size=chunk_size)
+    except archive.ArchiveError as e:
+        raise click.ClickException(str(e))
+    print(f"Imported {count} {table} rows from {path}")
+    if table != 'users':
+        print(f"Rebuilt {stats.rebuild_user_stage_stats()} user stage stats rows")
+
+@app.cli.command('compact-sessions')
+@click.option('--days', type=int, default=archive.ARCHIVE_RETENTION_DAYS, help='원본 세션을 남겨 둘 일수')
+@click.option('--export', 'export_path', default=None, help='지우기 전에 원본 세션을 내보낼 파일')
+@click.option('--chunk-size', type=int, default=archive.ARCHIVE_CHUNK_SIZE)
+@click.option('--vacuum/--no-vacuum', default=True, help='압축 후 VACUUM/ANALYZE 실행')
+def compact_sessions_command(days, export_path, chunk_size, vacuum):
+    """보존 기간이 지난 게임 세션을 일별 집계로 합치고 원본 행 삭제"""
+    db.create_all()
+    try:
+        count = archive.compact_sessions(archive.retention_cutoff(days), chunk_size=chunk_size, export_path=export_path)
+    except archive.ArchiveError as e:
+        raise click.ClickException(str(e))
+    print(f"Compacted {count} game sessions older than {days} days")
+    print(f"Pruned {prune_result_keys()} expired result keys")
+    if vacuum and count:
+        archive.optimize_database()
+        print("Database vacuumed and analyzed")
+
+@app.cli.command('compile-templates')
+def compile_templates_command():
+    """템플릿을 미리 컴파일해 JINJA_CACHE_DIR에 저장 (이미지 빌드 시 실행)"""
+    count = precompile_templates(app)
+    print(f"Compiled {count} templates")
+
+@app.cli.command('vacuum-db')
+def vacuum_db_command():
+    """VACUUM/ANALYZE로 삭제된 공간 회수와 쿼리 통계 갱신"""
+    archive.optimize_database()
+    print("Database vacuumed and analyzed")
+
+startup_report.mark('import')
+
 if __name__ == '__main__':
-    # 데이터베이스 초기화
-    init_database()
+    # 개발용 단일 프로세스 서버 (운영은 gunicorn.conf.py / serve.py 사용)
+    # 데이터베이스 초기화와 시작 준비
+    create_app()
     
     # 도커 환경을 위한 설정
     host = os.environ.get('HOST', '0.0.0.0')
@@ -0,0 +1,307 @@
+"""게임 기록 보관/압축
+
+GameSession은 플레이마다 한 행씩 계속 늘어나므로, 보존 기간이 지난 행은
+사용자/단계/날짜(UTC)별 GameSessionDaily로 합치고 원본 행은 지운다.
+원본은 지우기 전에 압축 CSV(.csv.gz) 또는 Parquet(.parquet, pyarrow 필요) 파일로
+내보낼 수 있고, 같은 파일을 다시 가져올 수 있어 SQLite <-> PostgreSQL 이전에도 쓴다.
+
+모든 작업은 id 순서의 키셋 청크 단위로 처리해 테이블 전체를 메모리에 올리지 않고,
+청크마다 커밋해 실행 중인 앱의 쓰기 잠금을 오래 잡지 않는다.
+"""
+import csv
+import gzip
+import os
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import Date, DateTime, Float, String, text, tuple_
+
+from models import db, User, GameSession, GameSessionDaily, insert_ignoring_duplicates
+
+# Parquet 형식은 선택 의존성이고 .parquet 파일을 쓸 때만 import (numpy까지 불러와 무거움)
+pyarrow = None
+
+ARCHIVE_CHUNK_SIZE = int(os.environ.get('ARCHIVE_CHUNK_SIZE', 5000))
+ARCHIVE_RETENTION_DAYS = int(os.environ.get('ARCHIVE_RETENTION_DAYS', 90))
+
+# 내보내기/가져오기 대상 테이블 (users는 DB 이전용, 비밀번호 해시가 들어 있으므로 파일 관리 주의)
+ARCHIVE_MODELS = {
+    'users': User,
+    'sessions': GameSession,
+    'daily': GameSessionDaily,
+}
+
+
+class ArchiveError(RuntimeError):
+    """보관 파일을 읽거나 쓸 수 없음"""
+
+
+def _import_pyarrow():
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow.parquet  # global pyarrow에 패키지가 바인딩됨
+        except ImportError:
+            return False
+    return True
+
+
+def archive_format(path):
+    if path.endswith('.parquet'):
+        if not _import_pyarrow():
+            raise ArchiveError('Parquet 형식은 pyarrow가 필요합니다. (pip install pyarrow)')
+        return 'parquet'
+    if path.endswith('.csv.gz'):
+        return 'csv'
+    raise ArchiveError('파일 이름은 .csv.gz 또는 .parquet로 끝나야 합니다.')
+
+
+def _columns(model):
+    return list(model.__table__.columns)
+
+
+def _parse_value(column, value):
+    """CSV 문자열을 컬럼 타입 값으로 변환 (빈 문자열은 NULL)"""
+    if value == '':
+        return None
+    if isinstance(column.type, DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, Date):
+        return date.fromisoformat(value)
+    if isinstance(column.type, Float):
+        return float(value)
+    if isinstance(column.type, String):
+        return value
+    return int(value)
+
+
+def _arrow_type(column):
+    if isinstance(column.type, DateTime):
+        return pyarrow.timestamp('us')
+    if isinstance(column.type, Date):
+        return pyarrow.date32()
+    if isinstance(column.type, Float):
+        return pyarrow.float64()
+    if isinstance(column.type, String):
+        return pyarrow.string()
+    return pyarrow.int64()
+
+
+class ArchiveWriter:
+    """청크 단위로 행을 이어 쓰는 보관 파일 (Parquet은 청크마다 row group 하나)"""
+
+    def __init__(self, path, model):
+        self.format = archive_format(path)
+        self.columns = _columns(model)
+        self.names = [column.name for column in self.columns]
+        self.rows_written = 0
+        if self.format == 'parquet':
+            self.schema = pyarrow.schema([(column.name, _arrow_type(column)) for column in self.columns])
+            self._writer = pyarrow.parquet.ParquetWriter(path, self.schema, compression='zstd')
+        else:
+            self._file = gzip.open(path, 'wt', encoding='utf-8', newline='')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(self.names)
+
+    def write(self, rows):
+        """rows: 컬럼 순서의 튜플 목록"""
+        if self.format == 'parquet':
+            columns = list(zip(*rows)) if rows else [()] * len(self.names)
+            self._writer.write_table(pyarrow.Table.from_arrays(
+                [pyarrow.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+                schema=self.schema
+            ))
+        else:
+            self._writer.writerows(
+                [value.isoformat() if isinstance(value, (date, datetime)) else value for value in row]
+                for row in rows
+            )
+        self.rows_written += len(rows)
+
+    def close(self):
+        if self.format == 'parquet':
+            self._writer.close()
+        else:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_archive(path, model, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """보관 파일을 청크 단위 dict 목록으로 읽기"""
+    columns = {column.name: column for column in _columns(model)}
+    if archive_format(path) == 'parquet':
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        missing = set(columns) - set(parquet_file.schema_arrow.names)
+        if missing:
+            raise ArchiveError(f"보관 파일에 없는 컬럼: {', '.join(sorted(missing))}")
+        for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=list(columns)):
+            yield batch.to_pylist()
+        return
+
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        reader = csv.DictReader(f)
+        missing = set(columns) - set(reader.fieldnames or ())
+        if missing:
+            raise ArchiveError(f"보관 파일에 없는 컬럼: {', '.join(sorted(missing))}")
+        chunk = []
+        for record in reader:
+            chunk.append({name: _parse_value(column, record[name]) for name, column in columns.items()})
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _chunks(model, chunk_size, *criteria):
+    """기본 키 순서의 키셋 청크 (OFFSET 없이 마지막 키 다음부터 조회)"""
+    key_columns = list(model.__table__.primary_key.columns)
+    last_key = None
+    while True:
+        query = db.select(*_columns(model)).where(*criteria)
+        if last_key is not None:
+            query = query.where(tuple_(*key_columns) > tuple_(*last_key))
+        rows = db.session.execute(query.order_by(*key_columns).limit(chunk_size)).all()
+        # 읽기 트랜잭션을 청크 사이에 계속 잡고 있지 않음
+        db.session.commit()
+        if not rows:
+            return
+        yield rows
+        last_key = [getattr(rows[-1], column.name) for column in key_columns]
+
+
+def export_table(path, table='sessions', before=None, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """테이블을 보관 파일로 내보내기 (before가 있으면 그 이전 세션만). 내보낸 행 수 반환"""
+    model = ARCHIVE_MODELS[table]
+    criteria = []
+    if before is not None and model is GameSession:
+        criteria.append(GameSession.created_at < before)
+    with ArchiveWriter(path, model) as writer:
+        for rows in _chunks(model, chunk_size, *criteria):
+            writer.write(rows)
+    return writer.rows_written
+
+
+def import_table(path, table='sessions', chunk_size=ARCHIVE_CHUNK_SIZE):
+    """보관 파일을 테이블로 가져오기 (id 유지). 읽은 행 수 반환"""
+    model = ARCHIVE_MODELS[table]
+    # 이미 있는 키는 건너뛰므로 같은 파일을 다시 가져와도 안전
+    statement = insert_ignoring_duplicates(model)
+    count = 0
+    for chunk in read_archive(path, model, chunk_size):
+        db.session.execute(statement, chunk)
+        db.session.commit()
+        count += len(chunk)
+
+    if model is not GameSessionDaily and db.engine.dialect.name == 'postgresql':
+        # id를 직접 넣었으므로 시퀀스를 최댓값 뒤로 옮김
+        table_name = model.__tablename__
+        db.session.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('\"{table_name}\"', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM \"{table_name}\"), 0) + 1, false)"
+        ))
+        db.session.commit()
+    return count
+
+
+def _merge_daily(rows):
+    """세션 행들을 GameSessionDaily에 더하기 (호출자의 트랜잭션 안에서 실행)"""
+    totals = {}
+    for row in rows:
+        key = (row.user_id, row.stage, row.created_at.date())
+        total = totals.setdefault(key, [0, 0, 0.0, 0, 0.0, 0, 0, row.created_at])
+        score, accuracy = row.score or 0, row.accuracy or 0.0
+        total[0] += 1
+        total[1] = max(total[1], score)
+        total[2] = max(total[2], accuracy)
+        total[3] += score
+        total[4] += accuracy
+        total[5] += row.words_completed or 0
+        total[6] += row.words_missed or 0
+        total[7] = max(total[7], row.created_at)
+
+    existing = {
+        (daily.user_id, daily.stage, daily.day): daily
+        for daily in GameSessionDaily.query.filter(
+            tuple_(GameSessionDaily.user_id, GameSessionDaily.stage, GameSessionDaily.day).in_(totals)
+        ).with_for_update()
+    }
+    for key, (sessions, best_score, best_accuracy, total_score, total_accuracy,
+              words_completed, words_missed, last_played) in totals.items():
+        daily = existing.get(key)
+        if daily is None:
+            user_id, stage, day = key
+            daily = GameSessionDaily(
+                user_id=user_id, stage=stage, day=day, sessions=0, best_score=0, best_accuracy=0.0,
+                total_score=0, total_accuracy=0.0, words_completed=0, words_missed=0,
+            )
+            db.session.add(daily)
+        daily.sessions += sessions
+        daily.best_score = max(daily.best_score, best_score)
+        daily.best_accuracy = max(daily.best_accuracy, best_accuracy)
+        daily.total_score += total_score
+        daily.total_accuracy += total_accuracy
+        daily.words_completed += words_completed
+        daily.words_missed += words_missed
+        daily.last_played_at = max(daily.last_played_at or last_played, last_played)
+
+
+def compact_sessions(before, chunk_size=ARCHIVE_CHUNK_SIZE, export_path=None):
+    """before 이전 세션을 일별 집계로 합치고 원본 행 삭제. 압축한 세션 수 반환
+
+    청크마다 집계 반영과 삭제를 한 트랜잭션으로 커밋하므로 중간에 멈춰도
+    이중 집계되지 않고, 다시 실행하면 남은 행부터 이어서 처리한다.
+    export_path가 있으면 지우기 전에 원본 행을 그 파일로 내보낸다.
+    UserStageStats는 이미 모든 세션을 반영하고 있으므로 바꾸지 않는다.
+    """
+    writer = ArchiveWriter(export_path, GameSession) if export_path else None
+    count = 0
+    try:
+        while True:
+            # 지운 행은 다시 나오지 않으므로 매번 처음부터 조회
+            rows = db.session.execute(
+                db.select(*_columns(GameSession)).where(GameSession.created_at < before)
+                .order_by(GameSession.id).limit(chunk_size)
+            ).all()
+            if not rows:
+                db.session.commit()
+                break
+            if writer is not None:
+                writer.write(rows)
+            _merge_daily(rows)
+            db.session.execute(db.delete(GameSession).where(GameSession.id.in_([row.id for row in rows])))
+            db.session.commit()
+            count += len(rows)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def retention_cutoff(days=ARCHIVE_RETENTION_DAYS):
+    """보존 기간(일) 기준 시각 (created_at과 같은 UTC)"""
+    return datetime.utcnow() - timedelta(days=days)
+
+
+def optimize_database():
+    """삭제 후 공간 회수와 통계 갱신 (VACUUM + ANALYZE)
+
+    SQLite는 WAL 모드에서 VACUUM 중에도 읽기는 계속되고 쓰기만 busy_timeout만큼 기다린다.
+    PostgreSQL은 테이블을 잠그지 않는 일반 VACUUM을 쓴다 (VACUUM FULL 아님).
+    """
+    engine = db.engine
+    db.session.remove()
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if engine.dialect.name == 'sqlite':
+            conn.execute(text('VACUUM'))
+            conn.execute(text('ANALYZE'))
+            conn.execute(text('PRAGMA wal_checkpoint(TRUNCATE)'))
+        elif engine.dialect.name == 'postgresql':
+            for model in (GameSession, GameSessionDaily):
+                conn.execute(text(f'VACUUM (ANALYZE) {model.__tablename__}'))
+        else:
+            conn.execute(text('ANALYZE'))
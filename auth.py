@@ -0,0 +1,205 @@
+"""로그인/회원가입 처리
+
+비밀번호 해시(PBKDF2)는 CPU를 오래 쓰므로 요청 스레드가 아니라 크기가 정해진
+프로세스 풀에서 계산한다. 동시에 처리할 해시 수에도 상한을 두어, 로그인이 몰리면
+자리가 날 때까지 잠깐(AUTH_HASH_QUEUE_WAIT) 기다리고 그래도 없으면 503을 돌려준다.
+로그인/회원가입 페이지는 503/429를 받으면 Retry-After만큼 기다렸다가 다시 보낸다.
+IP/사용자명별 토큰 버킷으로 무차별 대입 시도는 해시 계산 전에 걸러낸다.
+저장된 해시의 방식/반복 횟수가 AUTH_HASH_METHOD와 다르면 로그인 성공 시 다시 해시한다.
+
+풀 프로세스는 forkserver(없으면 spawn)로 만들므로, 이 모듈을 쓰는 스크립트는
+multiprocessing 규칙대로 `if __name__ == '__main__':` 안에서 실행해야 한다.
+"""
+import atexit
+import functools
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+AUTH_HASH_METHOD = os.environ.get('AUTH_HASH_METHOD', 'pbkdf2:sha256:600000')
+AUTH_HASH_WORKERS = int(os.environ.get('AUTH_HASH_WORKERS', 2))  # 0이면 요청 스레드에서 계산
+AUTH_HASH_MAX_PENDING = int(os.environ.get('AUTH_HASH_MAX_PENDING', 32))
+# 자리가 없을 때 기다릴 시간 (0이면 바로 503). 해시 시간까지 더해도 gunicorn timeout보다 짧게
+AUTH_HASH_QUEUE_WAIT = float(os.environ.get('AUTH_HASH_QUEUE_WAIT', 2))
+AUTH_HASH_TIMEOUT = float(os.environ.get('AUTH_HASH_TIMEOUT', 10))
+# 해시 프로세스의 CPU 우선순위를 낮춰 게임 요청을 먼저 처리
+AUTH_HASH_NICE = int(os.environ.get('AUTH_HASH_NICE', 10))
+
+AUTH_IP_RATE_PER_MINUTE = float(os.environ.get('AUTH_IP_RATE_PER_MINUTE', 120))
+AUTH_IP_BURST = int(os.environ.get('AUTH_IP_BURST', 60))
+AUTH_USER_RATE_PER_MINUTE = float(os.environ.get('AUTH_USER_RATE_PER_MINUTE', 10))
+AUTH_USER_BURST = int(os.environ.get('AUTH_USER_BURST', 5))
+AUTH_RATE_LIMIT_MAX_KEYS = int(os.environ.get('AUTH_RATE_LIMIT_MAX_KEYS', 100000))
+
+
+class AuthBusyError(RuntimeError):
+    """해시 대기열이 가득 차 지금은 처리할 수 없음"""
+
+
+class RateLimitedError(RuntimeError):
+    """요청 한도 초과"""
+
+    def __init__(self, retry_after):
+        super().__init__('요청이 너무 많습니다. 잠시 후 다시 시도해주세요.')
+        self.retry_after = retry_after
+
+
+# 프로세스 풀에서 실행되는 함수 (이 모듈만 import하면 되도록 앱에 의존하지 않음)
+
+def _lower_priority(increment):
+    if increment and hasattr(os, 'nice'):
+        os.nice(increment)
+
+
+@functools.lru_cache(maxsize=None)
+def hash_prefix(method):
+    """method로 만든 해시의 'method:파라미터' 부분 (werkzeug가 기본 파라미터를 채워 넣으므로 직접 만들어 봄)"""
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+def needs_rehash(password_hash, method=AUTH_HASH_METHOD):
+    return password_hash.split('$', 1)[0] != hash_prefix(method)
+
+
+def hash_password(password, method=AUTH_HASH_METHOD):
+    return generate_password_hash(password, method=method)
+
+
+def verify_password(password_hash, password, method=AUTH_HASH_METHOD):
+    """(일치 여부, 다시 해시해야 하면 새 해시 아니면 None)"""
+    if not check_password_hash(password_hash, password):
+        return False, None
+    if needs_rehash(password_hash, method):
+        return True, generate_password_hash(password, method=method)
+    return True, None
+
+
+class PasswordHasher:
+    """크기가 정해진 프로세스 풀에서 비밀번호 해시 계산"""
+
+    def __init__(self, workers=AUTH_HASH_WORKERS, max_pending=AUTH_HASH_MAX_PENDING,
+                 queue_wait=AUTH_HASH_QUEUE_WAIT, timeout=AUTH_HASH_TIMEOUT, method=AUTH_HASH_METHOD):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_wait = queue_wait
+        self.timeout = timeout
+        self.method = method
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._executor = None
+        self._executor_pid = None
+        self.rejected = 0
+        atexit.register(self.close)
+
+    def pending(self):
+        return self._pending
+
+    def _get_executor(self):
+        # gunicorn 워커마다 자기 풀을 따로 띄움 (fork 전에 만든 풀은 쓰지 않음)
+        if self._executor_pid != os.getpid():
+            with self._lock:
+                if self._executor_pid != os.getpid():
+                    # 스레드가 도는 프로세스에서 fork하지 않도록 forkserver로 풀 프로세스 생성
+                    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context(method),
+                        initializer=_lower_priority, initargs=(AUTH_HASH_NICE,)
+                    )
+                    self._executor_pid = os.getpid()
+        return self._executor
+
+    def _reset_executor(self):
+        with self._lock:
+            executor, self._executor, self._executor_pid = self._executor, None, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, func, *args):
+        acquired = self._slots.acquire(timeout=self.queue_wait) if self.queue_wait > 0 else self._slots.acquire(False)
+        if not acquired:
+            self.rejected += 1
+            raise AuthBusyError('로그인 요청이 많아 처리할 수 없습니다. 잠시 후 다시 시도해주세요.')
+        with self._lock:
+            self._pending += 1
+        try:
+            if self.workers <= 0:
+                return func(*args)
+            future = self._get_executor().submit(func, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                raise AuthBusyError('로그인 처리 시간이 초과되었습니다. 잠시 후 다시 시도해주세요.')
+            except BrokenProcessPool:
+                # 풀 프로세스가 죽으면 다음 요청에서 새로 띄움
+                self._reset_executor()
+                raise AuthBusyError('로그인 처리 중 오류가 발생했습니다. 잠시 후 다시 시도해주세요.')
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.method)
+
+    def verify(self, password_hash, password):
+        """(일치 여부, 새 해시 또는 None)"""
+        return self._run(verify_password, password_hash, password, self.method)
+
+    def close(self):
+        if self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class TokenBucketLimiter:
+    """키별 토큰 버킷 (분당 rate개씩 채워지고 최대 burst개)"""
+
+    def __init__(self, rate_per_minute, burst, max_keys=AUTH_RATE_LIMIT_MAX_KEYS):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()  # 키 -> (남은 토큰, 갱신 시각)
+
+    def hit(self, key):
+        """토큰 하나 사용. 허용되면 0, 아니면 다시 시도할 수 있을 때까지의 초"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                retry_after = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                retry_after = (1 - tokens) / self.rate
+            self._buckets.move_to_end(key)
+            # 오래 안 쓴 키부터 정리
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+class AuthRateLimiter:
+    """IP별, 사용자명별 한도를 모두 확인 (워커 프로세스마다 따로 계산)"""
+
+    def __init__(self):
+        self.by_ip = TokenBucketLimiter(AUTH_IP_RATE_PER_MINUTE, AUTH_IP_BURST)
+        self.by_username = TokenBucketLimiter(AUTH_USER_RATE_PER_MINUTE, AUTH_USER_BURST)
+        self.limited = 0
+
+    def check(self, ip, username=None):
+        """username은 검증된 문자열이어야 함"""
+        retry_after = self.by_ip.hit(ip)
+        if not retry_after and username:
+            retry_after = self.by_username.hit(username.lower())
+        if retry_after:
+            self.limited += 1
+            raise RateLimitedError(max(1, int(retry_after + 0.999)))
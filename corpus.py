@@ -0,0 +1,284 @@
+"""단어 코퍼스 저장소
+
+corpus/<언어>/<단어유형>.txt 원본을 SQLite 인덱스 파일로 빌드해 두고,
+워커는 파일을 읽기 전용(mmap)으로 열어 필요한 단어만 조회한다.
+"""
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+
+CORPUS_SOURCE_DIR = os.environ.get('CORPUS_SOURCE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus'))
+CORPUS_MMAP_SIZE = int(os.environ.get('CORPUS_MMAP_SIZE', 64 * 1024 * 1024))
+CORPUS_RELOAD_INTERVAL = float(os.environ.get('CORPUS_RELOAD_INTERVAL', 5))
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE words (
+    id INTEGER PRIMARY KEY,
+    lang TEXT NOT NULL,
+    word_type TEXT NOT NULL,
+    difficulty INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    charset TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE TABLE buckets (
+    lang TEXT NOT NULL,
+    word_type TEXT NOT NULL,
+    first_id INTEGER NOT NULL,
+    last_id INTEGER NOT NULL,
+    PRIMARY KEY (lang, word_type)
+);
+CREATE INDEX ix_words_lookup ON words (lang, word_type, difficulty, length, charset);
+"""
+
+
+def classify_charset(text):
+    """단어에 쓰인 문자 종류 분류"""
+    if text.isalpha():
+        return 'alpha' if text == text.lower() else 'mixed'
+    if all(c.isalpha() or c == ' ' for c in text):
+        return 'spaced'
+    return 'symbols'
+
+
+def estimate_difficulty(text):
+    """길이와 특수문자 수로 1~5 난이도 추정"""
+    symbols = sum(1 for c in text if not c.isalnum() and c != ' ')
+    return 1 + min(4, len(text) // 12 + symbols // 2)
+
+
+def read_sources(source_dir=CORPUS_SOURCE_DIR):
+    """원본 텍스트 파일을 {(언어, 단어유형): [단어, ...]} 형태로 읽기"""
+    sources = {}
+    for lang in sorted(os.listdir(source_dir)):
+        lang_dir = os.path.join(source_dir, lang)
+        if not os.path.isdir(lang_dir):
+            continue
+        for filename in sorted(os.listdir(lang_dir)):
+            word_type, ext = os.path.splitext(filename)
+            if ext != '.txt':
+                continue
+            with open(os.path.join(lang_dir, filename), encoding='utf-8') as f:
+                lines = (line.strip() for line in f)
+                # 주석/빈 줄 제거, 중복은 처음 나온 것만 유지
+                words = dict.fromkeys(line for line in lines if line and not line.startswith('#'))
+            sources[(lang, word_type)] = list(words)
+    return sources
+
+
+def source_hash(source_dir=CORPUS_SOURCE_DIR):
+    """원본 파일 내용 해시 (빌드된 파일이 최신인지 확인용)"""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            path = os.path.join(root, filename)
+            digest.update(os.path.relpath(path, source_dir).encode('utf-8'))
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def build_corpus(path, source_dir=CORPUS_SOURCE_DIR):
+    """원본으로 코퍼스 파일을 빌드해 원자적으로 교체"""
+    sources = read_sources(source_dir)
+    tmp_path = f'{path}.tmp-{os.getpid()}'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        next_id = 1
+        for (lang, word_type), words in sorted(sources.items()):
+            rows = sorted(
+                (estimate_difficulty(w), len(w), classify_charset(w), w) for w in words
+            )
+            # (언어, 단어유형)별로 id가 연속되도록 정렬해 넣어 범위 샘플링이 가능하게 함
+            conn.executemany(
+                'INSERT INTO words (id, lang, word_type, difficulty, length, charset, text) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(next_id + i, lang, word_type, *row) for i, row in enumerate(rows)]
+            )
+            conn.execute(
+                'INSERT INTO buckets VALUES (?, ?, ?, ?)',
+                (lang, word_type, next_id, next_id + len(rows) - 1)
+            )
+            next_id += len(rows)
+
+        digest = source_hash(source_dir)
+        conn.executemany('INSERT INTO meta VALUES (?, ?)', [
+            ('source_hash', digest),
+            ('version', digest[:12]),
+            ('built_at', str(int(time.time()))),
+        ])
+        conn.commit()
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+
+    os.replace(tmp_path, path)
+    return next_id - 1
+
+
+def ensure_corpus(path, source_dir=CORPUS_SOURCE_DIR):
+    """코퍼스 파일이 없거나 읽을 수 없으면 빌드. 빌드했으면 True
+
+    원본과 달라도 다시 빌드하지 않는다 (따로 빌드해 배포한 코퍼스를 덮어쓰지 않도록).
+    원본을 고친 뒤에는 build-corpus 명령으로 다시 빌드한다.
+    """
+    if os.path.exists(path):
+        try:
+            conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+            try:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            finally:
+                conn.close()
+            if row:
+                return False
+        except sqlite3.DatabaseError:
+            pass  # 손상된 파일은 다시 빌드
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    build_corpus(path, source_dir)
+    return True
+
+
+class CorpusStore:
+    """읽기 전용 코퍼스 조회 (스레드별 연결, 파일 교체 시 자동 재로드)
+
+    만들 때는 파일을 건드리지 않고, 처음 쓸 때(또는 open()) 파일을 확인/빌드해서 연다.
+    """
+
+    def __init__(self, path, lang='en', reload_interval=CORPUS_RELOAD_INTERVAL, source_dir=CORPUS_SOURCE_DIR):
+        self.path = path
+        self.lang = lang
+        self.reload_interval = reload_interval
+        self.source_dir = source_dir
+        self._version = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._file_stat = None
+        self._checked_at = 0.0
+        self._buckets = {}
+        self._filtered_ids = {}
+
+    def open(self):
+        """코퍼스 파일이 없거나 원본과 다르면 빌드하고 연다 (처음 한 번만)"""
+        if self._version is None:
+            with self._lock:
+                if self._version is None:
+                    ensure_corpus(self.path, self.source_dir)
+                    self._load()
+        return self
+
+    @property
+    def version(self):
+        self.open()
+        return self._version
+
+    def _stat(self):
+        st = os.stat(self.path)
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def _connection(self):
+        # fork된 워커나 재로드 이후에는 새 연결을 열어야 함
+        key = (os.getpid(), self._generation)
+        if getattr(self._local, 'key', None) != key:
+            conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            conn.execute(f'PRAGMA mmap_size = {CORPUS_MMAP_SIZE}')
+            self._local.conn = conn
+            self._local.key = key
+        return self._local.conn
+
+    def _load(self):
+        self._file_stat = self._stat()
+        self._checked_at = time.monotonic()
+        self._generation += 1
+        conn = self._connection()
+        self._version = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        self._buckets = {
+            word_type: (first_id, last_id)
+            for word_type, first_id, last_id in conn.execute(
+                'SELECT word_type, first_id, last_id FROM buckets WHERE lang = ?', (self.lang,)
+            )
+        }
+        self._filtered_ids = {}
+
+    def maybe_reload(self):
+        """파일이 교체되었으면 다시 연다 (reload_interval마다 한 번만 stat). 재로드 시 True"""
+        self.open()
+        if time.monotonic() - self._checked_at < self.reload_interval:
+            return False
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                changed = self._stat() != self._file_stat
+            except FileNotFoundError:
+                return False  # 교체 중이면 다음 확인 때 재시도
+            if changed:
+                self._load()
+            return changed
+
+    def word_types(self):
+        self.open()
+        return list(self._buckets)
+
+    def count(self, word_type):
+        self.open()
+        first_id, last_id = self._buckets.get(word_type, (1, 0))
+        return last_id - first_id + 1
+
+    def words(self, word_type):
+        """단어유형의 모든 단어를 순서대로 반환 (전체 목록이 필요한 빌드 작업용)"""
+        self.open()
+        return [text for (text,) in self._connection().execute(
+            'SELECT text FROM words WHERE lang = ? AND word_type = ? ORDER BY id',
+            (self.lang, word_type)
+        )]
+
+    def _ids_matching(self, word_type, filters):
+        key = (word_type, tuple(sorted(filters.items())))
+        ids = self._filtered_ids.get(key)
+        if ids is None:
+            clauses = ''.join(f' AND {column} = ?' for column, _ in key[1])
+            ids = [row_id for (row_id,) in self._connection().execute(
+                f'SELECT id FROM words WHERE lang = ? AND word_type = ?{clauses}',
+                (self.lang, word_type, *(value for _, value in key[1]))
+            )]
+            self._filtered_ids[key] = ids
+        return ids
+
+    def sample(self, word_type, k, rng=None, length=None, charset=None, difficulty=None):
+        """단어유형에서 k개를 중복 없이 무작위 추출
+
+        필터가 없으면 연속된 id 범위에서 바로 뽑으므로 O(k)이고,
+        필터가 있으면 인덱스로 찾은 id 목록을 캐시해 두고 뽑는다.
+        """
+        self.open()
+        rng = rng or random
+        filters = {
+            column: value
+            for column, value in (('length', length), ('charset', charset), ('difficulty', difficulty))
+            if value is not None
+        }
+        if filters:
+            candidates = self._ids_matching(word_type, filters)
+        else:
+            first_id, last_id = self._buckets.get(word_type, (1, 0))
+            candidates = range(first_id, last_id + 1)
+
+        chosen = rng.sample(candidates, min(k, len(candidates)))
+        if not chosen:
+            return []
+
+        placeholders = ','.join('?' * len(chosen))
+        texts = dict(self._connection().execute(
+            f'SELECT id, text FROM words WHERE id IN ({placeholders})', chosen
+        ))
+        return [texts[row_id] for row_id in chosen]
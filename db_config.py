@@ -0,0 +1,110 @@
+"""데이터베이스 엔진 설정
+
+SQLite는 연결마다 WAL/synchronous/mmap/busy_timeout PRAGMA를 적용하고,
+PostgreSQL은 커넥션 풀 크기/재사용/사전 점검을 환경 변수로 조정한다.
+"""
+import os
+import sqlite3
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+
+SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 20000))
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() == 'true'
+
+SQLITE_PRAGMAS = ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size')
+
+
+def normalize_database_uri(uri):
+    """postgres:// 형식(일부 호스팅 서비스)을 SQLAlchemy가 인식하는 형식으로 변환"""
+    if uri.startswith('postgres://'):
+        return 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    """DB 종류에 맞는 SQLALCHEMY_ENGINE_OPTIONS 생성"""
+    if uri.startswith('sqlite'):
+        return {
+            'connect_args': {
+                # sqlite3 드라이버 수준의 잠금 대기 (PRAGMA busy_timeout과 같은 값)
+                'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000,
+                'check_same_thread': False,
+            },
+        }
+
+    return {
+        'pool_size': DB_POOL_SIZE,
+        'max_overflow': DB_MAX_OVERFLOW,
+        'pool_timeout': DB_POOL_TIMEOUT,
+        'pool_recycle': DB_POOL_RECYCLE,
+        'pool_pre_ping': DB_POOL_PRE_PING,
+    }
+
+
+@event.listens_for(Engine, 'connect')
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    # 코퍼스 파일 등 SQLAlchemy 밖의 sqlite 연결에는 적용되지 않음
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f'PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}')
+        cursor.execute(f'PRAGMA synchronous = {SQLITE_SYNCHRONOUS}')
+        cursor.execute(f'PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}')
+        cursor.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}')
+        cursor.execute(f'PRAGMA cache_size = {-SQLITE_CACHE_SIZE_KB}')
+    finally:
+        cursor.close()
+
+
+def configure_database(app):
+    """db.init_app() 전에 호출해 엔진 옵션을 설정"""
+    uri = normalize_database_uri(app.config['SQLALCHEMY_DATABASE_URI'])
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    options = engine_options(uri)
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+
+def effective_settings(engine):
+    """실제로 적용된 엔진 설정 조회"""
+    settings = {'dialect': engine.dialect.name, 'pool': type(engine.pool).__name__}
+    if engine.dialect.name == 'sqlite':
+        with engine.connect() as conn:
+            for pragma in SQLITE_PRAGMAS:
+                settings[pragma] = conn.execute(text(f'PRAGMA {pragma}')).scalar()
+        return settings
+
+    pool = engine.pool
+    for name in ('size', 'timeout'):
+        getter = getattr(pool, name, None)
+        if callable(getter):
+            settings[f'pool_{name}'] = getter()
+    settings['max_overflow'] = getattr(pool, '_max_overflow', None)
+    settings['pool_recycle'] = getattr(pool, '_recycle', None)
+    settings['pool_pre_ping'] = getattr(pool, '_pre_ping', None)
+    with engine.connect():
+        # 첫 연결 후에야 서버 버전이 채워짐
+        settings['server_version'] = '.'.join(str(v) for v in engine.dialect.server_version_info or ())
+    return settings
+
+
+def report_engine_settings(engine):
+    """시작 시 적용된 DB 설정 출력 (기대값과 다르면 경고)"""
+    settings = effective_settings(engine)
+    print("Database engine settings: " + ', '.join(f"{k}={v}" for k, v in settings.items()))
+
+    if settings['dialect'] == 'sqlite' and str(settings['journal_mode']).lower() != SQLITE_JOURNAL_MODE.lower():
+        # 메모리 DB나 WAL을 지원하지 않는 파일 시스템(일부 네트워크 볼륨)
+        print(f"Warning: SQLite journal_mode is {settings['journal_mode']}, expected {SQLITE_JOURNAL_MODE}")
+    return settings
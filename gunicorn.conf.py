@@ -0,0 +1,52 @@
+"""gunicorn 설정
+
+    gunicorn -c gunicorn.conf.py app:app    (또는 python serve.py)
+
+마스터가 앱을 한 번 불러오고 create_app()으로 DB 초기화, 단어 번들, 맞춤 단어 행렬,
+리더보드, 템플릿 컴파일을 한 번만 실행한 뒤 워커를 fork하므로, 워커들은 이 메모리를
+copy-on-write로 공유하고 첫 요청부터 컴파일된 템플릿을 쓴다. 워커는 fork 직후 상속받은 DB 연결을 버리고 새로 연결한다.
+
+다시 시작:
+    kill -HUP <master>    워커를 하나씩 새로 띄움 (설정/환경 변수 반영, 코드는 preload된 그대로)
+    kill -USR2 <master>   새 코드로 새 마스터를 띄운 뒤, 옛 마스터에 -TERM
+"""
+import multiprocessing
+import os
+import tempfile
+
+# 워커마다 따로 모은 /metrics 값을 합치기 위한 공유 디렉터리 (앱 import 전에 설정)
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'typing-metrics'))
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5000)}"
+
+# 코어마다 워커 하나, 워커마다 스레드 여러 개 (요청 대부분이 짧은 I/O 대기)
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# 메모리 누수 대비로 일정 요청 수마다 워커 교체 (0이면 끔). jitter로 동시에 재시작하지 않게 함
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def on_starting(server):
+    # preload된 마스터에서 한 번만 실행 (워커마다 실행하지 않음)
+    from app import create_app
+    create_app()
+
+
+def post_fork(server, worker):
+    from models import db
+    from app import app
+    # 마스터가 init_database()에서 연 커넥션을 워커가 같이 쓰지 않도록 풀만 버림
+    with app.app_context():
+        db.engine.dispose(close=False)
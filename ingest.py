@@ -0,0 +1,555 @@
+"""스테이지 결과 수집 파이프라인
+
+요청 스레드는 결과를 검증해 큐에 넣기만 하고, 백그라운드 writer 스레드가
+쌓인 결과를 한 트랜잭션의 다중 행 INSERT로 저장한다.
+INGEST_DURABILITY=spool|fsync이면 큐에 넣기 전에 스풀 파일에 먼저 기록해
+프로세스가 죽어도 다음 시작 때 재생된다.
+
+스풀 세그먼트는 프로세스마다 새로 만든 ID로 이름을 붙이고, 쓰는 동안 flock을 잡는다.
+잠금을 잡을 수 있는 세그먼트는 주인 프로세스가 죽은 것이므로 재생한다 (PID는 재사용되고
+컨테이너마다 PID 공간이 달라 쓰지 않음). 어디까지 저장했는지는 결과와 같은 트랜잭션에서
+IngestCheckpoint에 기록하므로, 재생할 때 이미 저장한 결과를 다시 넣지 않는다.
+재시도해도 저장하지 못한 배치는 failed-*.log 파일로 옮겨 다음 시작 때 다시 시도한다.
+"""
+import atexit
+import glob
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from models import db, GameSession, IngestCheckpoint, SubmittedResult, insert_ignoring_duplicates
+
+try:
+    import fcntl
+except ImportError:  # Windows: 스풀 없이(INGEST_DURABILITY=none)만 사용 가능
+    fcntl = None
+
+INGEST_ASYNC = os.environ.get('INGEST_ASYNC', 'true').lower() == 'true'
+INGEST_QUEUE_SIZE = int(os.environ.get('INGEST_QUEUE_SIZE', 10000))
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', 500))
+INGEST_FLUSH_INTERVAL = float(os.environ.get('INGEST_FLUSH_INTERVAL', 0.2))
+INGEST_ENQUEUE_TIMEOUT = float(os.environ.get('INGEST_ENQUEUE_TIMEOUT', 0.5))
+INGEST_DURABILITY = os.environ.get('INGEST_DURABILITY', 'none').lower()  # none | spool | fsync
+INGEST_SPOOL_SEGMENT_SIZE = int(os.environ.get('INGEST_SPOOL_SEGMENT_SIZE', 5000))
+# 일괄 전송(/api/complete-stages) 한 번에 받을 결과 수와 오프라인 큐에서 받아 줄 최대 경과 일수
+INGEST_BATCH_MAX_RESULTS = int(os.environ.get('INGEST_BATCH_MAX_RESULTS', 50))
+INGEST_MAX_RESULT_AGE_DAYS = int(os.environ.get('INGEST_MAX_RESULT_AGE_DAYS', 7))
+# 결과 값 상한 (넘으면 상한으로 맞춤. 정수 컬럼 범위를 넘는 값이 배치 전체를 실패시키지 않도록)
+RESULT_MAX_SCORE = int(os.environ.get('RESULT_MAX_SCORE', 1000000))
+RESULT_MAX_WORDS = int(os.environ.get('RESULT_MAX_WORDS', 10000))
+
+RESULT_FIELDS = ('stage', 'score', 'accuracy', 'words_completed', 'words_missed')
+RESULT_KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+class ValidationError(ValueError):
+    """잘못된 스테이지 결과"""
+
+
+class QueueFullError(RuntimeError):
+    """수집 큐가 가득 차 결과를 받을 수 없음"""
+
+
+def validate_result(data, stage_config):
+    """클라이언트가 보낸 결과를 검증해 저장 가능한 dict로 변환"""
+    if not isinstance(data, dict):
+        raise ValidationError('잘못된 요청 형식입니다.')
+
+    try:
+        result = {
+            'stage': int(data.get('stage')),
+            'score': int(data.get('score', 0)),
+            'accuracy': float(data.get('accuracy', 0.0)),
+            'words_completed': int(data.get('words_completed', 0)),
+            'words_missed': int(data.get('words_missed', 0)),
+        }
+    except (TypeError, ValueError, OverflowError):
+        # OverflowError: JSON의 Infinity를 int()로 바꿀 때
+        raise ValidationError('결과 값의 형식이 올바르지 않습니다.')
+
+    if result['stage'] not in stage_config:
+        raise ValidationError('유효하지 않은 단계입니다.')
+    if result['score'] < 0 or result['words_completed'] < 0 or result['words_missed'] < 0:
+        raise ValidationError('결과 값은 음수일 수 없습니다.')
+    if not 0.0 <= result['accuracy'] <= 100.0:
+        raise ValidationError('정확도는 0~100 사이여야 합니다.')
+    result['score'] = min(result['score'], RESULT_MAX_SCORE)
+    result['words_completed'] = min(result['words_completed'], RESULT_MAX_WORDS)
+    result['words_missed'] = min(result['words_missed'], RESULT_MAX_WORDS)
+    return result
+
+
+def validate_batch_item(data, stage_config):
+    """일괄 전송 결과 하나를 (멱등성 키, 결과, 플레이 시각)으로 변환"""
+    result = validate_result(data, stage_config)
+    key = data.get('id')
+    if not isinstance(key, str) or not RESULT_KEY_PATTERN.match(key):
+        raise ValidationError('결과 ID가 올바르지 않습니다.')
+
+    # 클라이언트 시계(epoch ms) 기준 플레이 시각. 미래 시각은 지금으로 맞춤
+    now = datetime.utcnow()
+    played_at = now
+    if data.get('played_at') is not None:
+        try:
+            played_at = min(now, datetime.utcfromtimestamp(float(data['played_at']) / 1000))
+        except (TypeError, ValueError, OverflowError, OSError):
+            raise ValidationError('플레이 시각의 형식이 올바르지 않습니다.')
+    if played_at < now - timedelta(days=INGEST_MAX_RESULT_AGE_DAYS):
+        raise ValidationError('너무 오래된 결과입니다.')
+    return key, result, played_at
+
+
+def seen_result_keys(user_id, keys):
+    """이미 저장된 멱등성 키 집합 (저장할 때 같은 트랜잭션에서 다시 확인하므로 응답용)"""
+    if not keys:
+        return set()
+    seen = {
+        key for (key,) in db.session.query(SubmittedResult.key).filter(
+            SubmittedResult.user_id == user_id, SubmittedResult.key.in_(set(keys))
+        )
+    }
+    db.session.commit()
+    return seen
+
+
+def claim_new_results(rows):
+    """멱등성 키가 붙은 행은 SubmittedResult에 처음 기록된 것만 남김 (저장 트랜잭션 안에서 호출)"""
+    keyed = {}
+    for row in rows:
+        if row.get('key') is not None:
+            keyed.setdefault((row['user_id'], row['key']), row)
+    if not keyed:
+        return rows
+
+    now = datetime.utcnow()
+    statement = insert_ignoring_duplicates(SubmittedResult).values([
+        {'user_id': user_id, 'key': key, 'created_at': now} for user_id, key in keyed
+    ]).returning(SubmittedResult.user_id, SubmittedResult.key)
+    claimed = {tuple(row) for row in db.session.execute(statement)}
+    return [
+        row for row in rows
+        if row.get('key') is None or (
+            (row['user_id'], row['key']) in claimed and keyed[(row['user_id'], row['key'])] is row
+        )
+    ]
+
+
+def prune_result_keys(max_age_days=INGEST_MAX_RESULT_AGE_DAYS):
+    """받아 줄 수 있는 기간이 지난 멱등성 키 삭제. 삭제한 수 반환"""
+    result = db.session.execute(db.delete(SubmittedResult).where(
+        SubmittedResult.created_at < datetime.utcnow() - timedelta(days=max_age_days)
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+class ResultSpool:
+    """큐에 들어간 결과를 세그먼트 파일에 먼저 기록하는 WAL
+
+    results-<스풀 ID>.lock: 주인 프로세스가 살아 있는 동안 flock을 잡고 있는 파일
+    results-<스풀 ID>-<번호>.log: 줄마다 seq가 붙은 결과 (cancel 줄은 재생하지 않을 seq)
+    """
+
+    def __init__(self, spool_dir, fsync=False, segment_size=INGEST_SPOOL_SEGMENT_SIZE):
+        if fcntl is None:
+            raise RuntimeError('INGEST_DURABILITY=spool|fsync는 fcntl(flock)이 있는 환경에서만 쓸 수 있습니다.')
+        self.spool_dir = spool_dir
+        self.fsync = fsync
+        self.segment_size = segment_size
+        self._id_lock = threading.Lock()
+        self._pid = None
+        self._spool_id = None
+        self._lock_path = None
+        self._lock_file = None
+        self._segment_no = 0
+        self._file = None
+        self._path = None
+        self._count = 0
+        self._closed_segments = []  # (경로, 마지막 seq)
+
+    @property
+    def spool_id(self):
+        # fork된 워커는 부모의 세그먼트를 이어 쓰지 않고 자기 ID로 새로 시작
+        if self._pid != os.getpid():
+            with self._id_lock:
+                if self._pid != os.getpid():
+                    self._spool_id = uuid.uuid4().hex
+                    self._lock_path = None
+                    self._lock_file = None
+                    self._segment_no = 0
+                    self._file = None
+                    self._closed_segments = []
+                    self._pid = os.getpid()
+        return self._spool_id
+
+    def _open_segment(self):
+        spool_id = self.spool_id
+        if self._lock_file is None:
+            os.makedirs(self.spool_dir, exist_ok=True)
+            # 잠근 뒤에 이름을 바꿔, 다른 프로세스가 잠기지 않은 잠금 파일을 보지 않게 함
+            self._lock_path = os.path.join(self.spool_dir, f'results-{spool_id}.lock')
+            self._lock_file = open(self._lock_path + '.tmp', 'a')
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.rename(self._lock_path + '.tmp', self._lock_path)
+        self._segment_no += 1
+        self._path = os.path.join(self.spool_dir, f'results-{spool_id}-{self._segment_no:06d}.log')
+        self._file = open(self._path, 'a', encoding='utf-8')
+        self._count = 0
+
+    def _write(self, entries):
+        if self._file is None:
+            self._open_segment()
+        for entry in entries:
+            self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def append(self, seq, row):
+        """호출자가 잠금을 잡은 상태에서 호출"""
+        self._write([{**row, 'seq': seq, 'created_at': row['created_at'].isoformat()}])
+        self._count += 1
+        if self._count >= self.segment_size:
+            self.rotate(seq)
+
+    def cancel(self, seqs):
+        """재생하지 않을 seq 기록 (큐에 넣지 못했거나 failed-*.log로 옮긴 결과). 호출자가 잠금을 잡은 상태에서 호출"""
+        self._write([{'seq': seq, 'cancel': True} for seq in seqs])
+
+    def rotate(self, last_seq):
+        if self._file is not None:
+            self._file.close()
+            self._closed_segments.append((self._path, last_seq))
+            self._file = None
+
+    def release(self, committed_seq):
+        """committed_seq까지 저장된 세그먼트 삭제"""
+        remaining = []
+        for path, last_seq in self._closed_segments:
+            if last_seq <= committed_seq:
+                os.remove(path)
+            else:
+                remaining.append((path, last_seq))
+        self._closed_segments = remaining
+
+    def write_failed(self, rows):
+        """재시도해도 저장하지 못한 배치를 별도 파일로 옮김 (다음 시작 때 다시 시도)"""
+        os.makedirs(self.spool_dir, exist_ok=True)
+        path = os.path.join(self.spool_dir, f'failed-{uuid.uuid4().hex}.log')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps({**row, 'created_at': row['created_at'].isoformat()}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(path + '.tmp', path)
+        return path
+
+    def _try_lock(self, path):
+        """path를 열어 flock을 잡을 수 있으면 (잠근 파일), 다른 프로세스가 잡고 있거나 이미 지워졌으면 None"""
+        try:
+            f = open(path, encoding='utf-8')
+        except FileNotFoundError:
+            return None
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # 잠금을 잡기 전에 다른 프로세스가 재생을 마치고 지웠으면 건너뜀
+            if os.stat(path).st_ino != os.fstat(f.fileno()).st_ino:
+                raise FileNotFoundError(path)
+        except (BlockingIOError, FileNotFoundError):
+            f.close()
+            return None
+        return f
+
+    def claim_orphans(self):
+        """주인이 종료된 스풀 ID와 실패 배치 파일을 잠가 하나씩 돌려줌
+
+        (스풀 ID, 잠근 파일, 세그먼트 경로 목록) 또는 실패 배치면 (None, 잠근 파일, [경로])
+        """
+        own = self.spool_id
+        for lock_path in sorted(glob.glob(os.path.join(self.spool_dir, 'results-*.lock'))):
+            spool_id = os.path.basename(lock_path)[len('results-'):-len('.lock')]
+            if spool_id == own:
+                continue
+            f = self._try_lock(lock_path)
+            if f is not None:
+                segments = sorted(glob.glob(os.path.join(self.spool_dir, f'results-{spool_id}-*.log')))
+                yield spool_id, f, segments
+        for path in sorted(glob.glob(os.path.join(self.spool_dir, 'failed-*.log'))):
+            f = self._try_lock(path)
+            if f is not None:
+                yield None, f, [path]
+
+    @staticmethod
+    def read_segments(paths):
+        """세그먼트들의 결과를 seq 순서로 (취소된 seq 제외)"""
+        rows, cancelled = [], set()
+        for path in paths:
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                    except ValueError:
+                        break  # 기록 중 죽어서 잘린 마지막 줄
+                    if row.get('cancel'):
+                        cancelled.add(row['seq'])
+                        continue
+                    row['created_at'] = datetime.fromisoformat(row['created_at'])
+                    rows.append(row)
+        return [row for row in rows if row.get('seq') not in cancelled]
+
+    def close(self):
+        """세그먼트가 모두 정리됐으면 잠금 파일도 지우고 True (남은 세그먼트는 다음 시작 때 재생)"""
+        if self._pid != os.getpid() or self._file is not None or self._closed_segments:
+            return False
+        if self._lock_file is not None:
+            os.remove(self._lock_path)
+            self._lock_file.close()
+            self._lock_file = None
+        return True
+
+
+class ResultIngestor:
+    """결과 큐와 백그라운드 일괄 저장 writer"""
+
+    def __init__(self, app, async_mode=INGEST_ASYNC, queue_size=INGEST_QUEUE_SIZE,
+                 batch_size=INGEST_BATCH_SIZE, flush_interval=INGEST_FLUSH_INTERVAL,
+                 durability=INGEST_DURABILITY, spool_dir=None):
+        self.app = app
+        self.async_mode = async_mode
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.spool = None
+        if durability in ('spool', 'fsync'):
+            self.spool = ResultSpool(spool_dir, fsync=durability == 'fsync')
+
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._committed_seq = 0
+        self._writer = None
+        self._writer_pid = None
+        self._stopping = False
+        self._batch_hooks = []
+        self.batches_written = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.rows_failed = 0  # 저장하지 못해 failed-*.log로 옮긴 결과 수
+        atexit.register(self.close)
+
+    def add_batch_hook(self, hook):
+        """저장과 같은 트랜잭션 안에서 hook(rows)를 호출 (통계 갱신 등)"""
+        self._batch_hooks.append(hook)
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def submit(self, user_id, result, created_at=None, key=None):
+        """검증된 결과 하나를 저장 대기열에 넣기 (가득 차면 QueueFullError)
+
+        스풀을 쓰면 반환될 때 결과가 스풀 파일에 기록된 상태다. key(멱등성 키)가 있으면
+        저장 트랜잭션에서 SubmittedResult에 함께 기록하고, 이미 있는 키면 저장하지 않는다.
+        """
+        row = {'user_id': user_id, 'created_at': created_at or datetime.utcnow()}
+        row.update((field, result[field]) for field in RESULT_FIELDS)
+        if key is not None:
+            row['key'] = key
+
+        if not self.async_mode:
+            self._write_batch([row])
+            return
+
+        self._ensure_writer()
+        if self.spool is None:
+            self._put((0, row))
+            return
+
+        # 스풀에 먼저 기록한 뒤 큐에 넣음. 스풀 기록 순서와 큐 순서가 같도록 잠금 안에서 둘 다 처리
+        with self._lock:
+            self._seq += 1
+            self.spool.append(self._seq, row)
+            try:
+                self._put((self._seq, row))
+            except QueueFullError:
+                self.spool.cancel([self._seq])
+                raise
+
+    def _put(self, item):
+        try:
+            self.queue.put(item, timeout=INGEST_ENQUEUE_TIMEOUT)
+        except queue.Full:
+            raise QueueFullError('결과 저장 대기열이 가득 찼습니다.')
+
+    def _ensure_writer(self):
+        # gunicorn 등에서 fork된 워커는 자기 writer 스레드를 새로 띄워야 함
+        if self._writer_pid == os.getpid() and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer_pid == os.getpid() and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._run, name='result-ingestor', daemon=True)
+            self._writer_pid = os.getpid()
+            self._writer.start()
+
+    def _drain(self, block):
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval) if block else self.queue.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            replayed = self.replay_spool()
+            if replayed:
+                print(f"Replayed {replayed} spooled results")
+        except Exception as e:
+            print(f"Result spool replay failed: {e}")
+
+        while not self._stopping:
+            batch = self._drain(block=True)
+            if batch:
+                self._commit(batch)
+
+    def _commit(self, batch):
+        rows = [row for _, row in batch]
+        checkpoint = (self.spool.spool_id, batch[-1][0]) if self.spool is not None else None
+        for attempt in range(3):
+            try:
+                self._write_batch(rows, checkpoint)
+                break
+            except Exception as e:
+                print(f"Result ingest batch failed ({len(rows)} rows, attempt {attempt + 1}): {e}")
+                time.sleep(0.5 * (attempt + 1))
+        else:
+            if self.spool is None:
+                self.rows_dropped += len(rows)
+                return
+            # 스풀 세그먼트는 아래에서 지워지므로, 실패한 배치는 따로 남겨 다음 시작 때 다시 시도
+            # (옮긴 뒤 세그먼트에서는 취소로 표시해 두 곳에서 재생되지 않게 함)
+            try:
+                path = self.spool.write_failed(rows)
+                with self._lock:
+                    self.spool.cancel([seq for seq, _ in batch])
+            except OSError as e:
+                # 디스크에도 남기지 못하면 버림 (rows_dropped로 확인)
+                print(f"Failed to save unsaved results: {e}")
+                self.rows_dropped += len(rows)
+                return
+            print(f"Moved {len(rows)} unsaved results to {path}")
+            self.rows_failed += len(rows)
+
+        if self.spool is not None:
+            with self._lock:
+                self._committed_seq = max(self._committed_seq, batch[-1][0])
+                if self._committed_seq == self._seq:
+                    self.spool.rotate(self._seq)
+                self.spool.release(self._committed_seq)
+
+    def _write_batch(self, rows, checkpoint=None):
+        """rows 저장. checkpoint=(스풀 ID, seq)면 같은 트랜잭션에서 저장 위치도 기록"""
+        with self.app.app_context():
+            try:
+                rows = claim_new_results(rows)
+                if rows:
+                    db.session.execute(db.insert(GameSession), [
+                        {k: v for k, v in row.items() if k != 'key'} for row in rows
+                    ])
+                    for hook in self._batch_hooks:
+                        hook(rows)
+                if checkpoint is not None:
+                    spool_id, seq = checkpoint
+                    updated = db.session.execute(db.update(IngestCheckpoint).where(
+                        IngestCheckpoint.spool_id == spool_id
+                    ).values(seq=seq, updated_at=datetime.utcnow())).rowcount
+                    if not updated:
+                        db.session.execute(db.insert(IngestCheckpoint).values(
+                            spool_id=spool_id, seq=seq, updated_at=datetime.utcnow()
+                        ))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        self.batches_written += 1
+        self.rows_written += len(rows)
+
+    def flush(self):
+        """대기 중인 결과를 호출한 스레드에서 모두 저장"""
+        while True:
+            batch = self._drain(block=False)
+            if not batch:
+                return
+            self._commit(batch)
+
+    def _checkpoint(self, spool_id):
+        with self.app.app_context():
+            checkpoint = db.session.get(IngestCheckpoint, spool_id)
+            seq = checkpoint.seq if checkpoint else 0
+            db.session.rollback()
+        return seq
+
+    def _forget_checkpoint(self, spool_id):
+        with self.app.app_context():
+            db.session.execute(db.delete(IngestCheckpoint).where(IngestCheckpoint.spool_id == spool_id))
+            db.session.commit()
+
+    def replay_spool(self):
+        """종료된 프로세스가 저장하지 못하고 남긴 스풀 세그먼트와 실패 배치 재생"""
+        if self.spool is None:
+            return 0
+        replayed = 0
+        for spool_id, f, paths in self.spool.claim_orphans():
+            try:
+                rows = ResultSpool.read_segments(paths)
+                if spool_id is None:
+                    # 실패 배치 파일은 한 배치 크기 이하이므로 한 트랜잭션으로 저장
+                    self._write_batch(rows)
+                else:
+                    # 이미 저장된 seq는 건너뛰고, 재생 위치도 같은 트랜잭션에 기록
+                    committed = self._checkpoint(spool_id)
+                    rows = [row for row in rows if row['seq'] > committed]
+                    for start in range(0, len(rows), self.batch_size):
+                        chunk = rows[start:start + self.batch_size]
+                        self._write_batch([{k: v for k, v in row.items() if k != 'seq'} for row in chunk],
+                                          (spool_id, chunk[-1]['seq']))
+                # 잠금을 잡은 채로 지워서, 잠금을 기다리던 프로세스가 다시 재생하지 않게 함
+                for path in paths:
+                    os.remove(path)
+                if spool_id is not None:
+                    self._forget_checkpoint(spool_id)
+                    os.remove(f.name)
+            except Exception as e:
+                # 파일은 그대로 두고 다음 시작 때 다시 시도
+                print(f"Result spool replay failed ({f.name}): {e}")
+                continue
+            finally:
+                f.close()
+            replayed += len(rows)
+        return replayed
+
+    def close(self):
+        if self._writer_pid != os.getpid():
+            return
+        self._stopping = True
+        self._writer.join(timeout=self.flush_interval * 2)
+        self.flush()
+        if self.spool is not None and self._seq:
+            with self._lock:
+                if self._committed_seq == self._seq:
+                    self.spool.rotate(self._seq)
+                    self.spool.release(self._committed_seq)
+                clean = self.spool.close()
+            if clean:
+                try:
+                    self._forget_checkpoint(self.spool.spool_id)
+                except Exception as e:
+                    print(f"Failed to clear ingest checkpoint: {e}")
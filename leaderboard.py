@@ -0,0 +1,287 @@
+"""리더보드
+
+단계별/전체 순위를 메모리의 정렬 배열(bisect)로 유지한다. 순위 조회는 O(log n)이고,
+기록 갱신은 배열 삽입/삭제(memmove) 한 번이다. REDIS_URL이 있으면 갱신을 Redis
+sorted set에도 반영하고, 워커들은 주기적으로 Redis에서 다시 읽어 서로의 갱신을 받는다.
+Redis가 없으면 같은 주기로 UserStageStats에서 다시 읽는다. 다시 읽기는 워커마다 띄우는
+백그라운드 스레드에서 하므로 요청은 기다리지 않는다.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+
+from flask import current_app
+
+from models import User, UserStageStats
+
+# redis는 선택 의존성이고 REDIS_URL이 있을 때만 import (import_redis)
+redis = None
+
+LEADERBOARD_REFRESH_SECONDS = float(os.environ.get('LEADERBOARD_REFRESH_SECONDS', 30))
+LEADERBOARD_MAX_LIMIT = 100
+REDIS_URL = os.environ.get('REDIS_URL')
+REDIS_KEY_PREFIX = os.environ.get('LEADERBOARD_REDIS_PREFIX', 'typing:leaderboard')
+
+# 단계 최고 기록이 오르면 전체 합계도 그 차이만큼 올림 (원자적으로 처리)
+REDIS_RECORD_SCRIPT = """
+local old = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if old and tonumber(old) >= tonumber(ARGV[2]) then
+    return 0
+end
+local old_score = old and math.floor(tonumber(old)) or 0
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('ZINCRBY', KEYS[2], tonumber(ARGV[3]) - old_score, ARGV[1])
+return 1
+"""
+
+
+def import_redis():
+    """redis 패키지를 불러옴 (설치되어 있지 않으면 False)"""
+    global redis
+    if redis is None:
+        try:
+            import redis as redis_module
+        except ImportError:
+            return False
+        redis = redis_module
+    return True
+
+
+class RankedIndex:
+    """사용자별 기록 하나씩을 (-점수, -정확도, user_id) 순으로 정렬해 보관"""
+
+    def __init__(self):
+        self._keys = []
+        self._by_user = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, user_id):
+        key = self._by_user.get(user_id)
+        if key is None:
+            return None
+        return -key[0], 0.0 - key[1]
+
+    def set(self, user_id, score, accuracy=0.0):
+        key = (-score, -accuracy, user_id)
+        old = self._by_user.get(user_id)
+        if old == key:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, old)]
+        insort(self._keys, key)
+        self._by_user[user_id] = key
+
+    def update_best(self, user_id, score, accuracy=0.0):
+        """기존 기록보다 좋을 때만 반영. 반영했으면 True"""
+        old = self._by_user.get(user_id)
+        if old is not None and old <= (-score, -accuracy, user_id):
+            return False
+        self.set(user_id, score, accuracy)
+        return True
+
+    def rank(self, user_id):
+        """1부터 시작하는 순위 (기록이 없으면 None)"""
+        key = self._by_user.get(user_id)
+        if key is None:
+            return None
+        return bisect_left(self._keys, key) + 1
+
+    def top(self, n):
+        return [(user_id, -neg_score, 0.0 - neg_accuracy) for neg_score, neg_accuracy, user_id in self._keys[:n]]
+
+    @classmethod
+    def from_records(cls, records):
+        """(user_id, 점수, 정확도) 목록으로 한 번에 생성"""
+        index = cls()
+        index._by_user = {user_id: (-score, -accuracy, user_id) for user_id, score, accuracy in records}
+        index._keys = sorted(index._by_user.values())
+        return index
+
+
+class RedisMirror:
+    """리더보드 갱신을 Redis sorted set에 반영 (점수 + 정확도/1000을 sorted set 점수로 사용)"""
+
+    def __init__(self, url, prefix=REDIS_KEY_PREFIX):
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._record = self.client.register_script(REDIS_RECORD_SCRIPT)
+
+    def stage_key(self, stage):
+        return f'{self.prefix}:stage:{stage}'
+
+    @property
+    def overall_key(self):
+        return f'{self.prefix}:overall'
+
+    def record(self, user_id, stage, score, accuracy):
+        self._record(
+            keys=[self.stage_key(stage), self.overall_key],
+            args=[user_id, score + accuracy / 1000, score]
+        )
+
+    def seed(self, stage_records, totals):
+        """DB에서 읽은 기록으로 채우기 (GT 옵션이라 여러 워커가 동시에 해도 안전)"""
+        pipe = self.client.pipeline(transaction=False)
+        for stage, records in stage_records.items():
+            mapping = {user_id: score + accuracy / 1000 for user_id, score, accuracy in records}
+            if mapping:
+                pipe.zadd(self.stage_key(stage), mapping, gt=True)
+        if totals:
+            pipe.zadd(self.overall_key, totals, gt=True)
+        pipe.execute()
+
+    def load(self, stages):
+        """Redis의 현재 상태를 ({단계: [(user_id, 점수, 정확도)]}, {user_id: 합계})로 읽기"""
+        pipe = self.client.pipeline(transaction=False)
+        for stage in stages:
+            pipe.zrange(self.stage_key(stage), 0, -1, withscores=True)
+        pipe.zrange(self.overall_key, 0, -1, withscores=True)
+        results = pipe.execute()
+
+        stage_records = {}
+        for stage, members in zip(stages, results[:-1]):
+            stage_records[stage] = [
+                (int(member), int(value), round((value - int(value)) * 1000, 2))
+                for member, value in members
+            ]
+        totals = {int(member): int(value) for member, value in results[-1]}
+        return stage_records, totals
+
+
+class Leaderboard:
+    """단계별/전체 리더보드"""
+
+    def __init__(self, stages, refresh_seconds=LEADERBOARD_REFRESH_SECONDS, redis_url=REDIS_URL):
+        self.stages = list(stages)
+        self.refresh_seconds = refresh_seconds
+        self.mirror = None
+        if redis_url:
+            if not import_redis():
+                print("Warning: REDIS_URL is set but the redis package is not installed; leaderboard stays in memory")
+            else:
+                self.mirror = RedisMirror(redis_url)
+        self._lock = threading.Lock()
+        self._stage_indexes = {stage: RankedIndex() for stage in self.stages}
+        self._overall = RankedIndex()
+        self._usernames = {}
+        self._refreshed_at = None
+        self._refresher = None
+        self._refresher_pid = None
+
+    def _load_from_db(self):
+        stage_records = {stage: [] for stage in self.stages}
+        totals = {}
+        rows = UserStageStats.query.with_entities(
+            UserStageStats.user_id, UserStageStats.stage,
+            UserStageStats.best_score, UserStageStats.best_accuracy
+        )
+        for user_id, stage, best_score, best_accuracy in rows:
+            if stage in stage_records:
+                stage_records[stage].append((user_id, best_score, best_accuracy))
+                totals[user_id] = totals.get(user_id, 0) + best_score
+        return stage_records, totals
+
+    def refresh(self):
+        """DB(또는 Redis)에서 전체 순위를 다시 읽어 교체. 앱 컨텍스트 안에서 호출"""
+        if self.mirror is not None:
+            try:
+                if self._refreshed_at is None:
+                    self.mirror.seed(*self._load_from_db())
+                stage_records, totals = self.mirror.load(self.stages)
+            except redis.RedisError as e:
+                print(f"Leaderboard Redis refresh failed, using database: {e}")
+                stage_records, totals = self._load_from_db()
+        else:
+            stage_records, totals = self._load_from_db()
+
+        stage_indexes = {stage: RankedIndex.from_records(stage_records.get(stage, ())) for stage in self.stages}
+        overall = RankedIndex.from_records((user_id, total, 0.0) for user_id, total in totals.items())
+        with self._lock:
+            self._stage_indexes = stage_indexes
+            self._overall = overall
+            self._refreshed_at = time.monotonic()
+
+    def _ensure_refresher(self):
+        """처음 한 번은 바로 읽고, 이후에는 백그라운드 스레드가 주기적으로 다시 읽음. 앱 컨텍스트 안에서 호출"""
+        if self._refreshed_at is None:
+            self.refresh()
+        # gunicorn 등에서 fork된 워커는 자기 스레드를 새로 띄워야 함
+        if self._refresher_pid == os.getpid() and self._refresher.is_alive():
+            return
+        with self._lock:
+            if self._refresher_pid == os.getpid() and self._refresher.is_alive():
+                return
+            self._refresher = threading.Thread(
+                target=self._run_refresher, args=(current_app._get_current_object(),),
+                name='leaderboard-refresh', daemon=True
+            )
+            self._refresher_pid = os.getpid()
+            self._refresher.start()
+
+    def _run_refresher(self, app):
+        while True:
+            time.sleep(max(0.0, self._refreshed_at + self.refresh_seconds - time.monotonic()))
+            try:
+                with app.app_context():
+                    self.refresh()
+            except Exception as e:
+                print(f"Leaderboard refresh failed: {e}")
+                self._refreshed_at = time.monotonic()  # 다음 주기에 다시 시도
+
+    def record(self, user_id, stage, score, accuracy, username=None):
+        """새 게임 결과 반영 (단계 최고 기록이 오른 경우에만 순위 변경)"""
+        if username is not None:
+            self._usernames[user_id] = username
+        with self._lock:
+            index = self._stage_indexes.get(stage)
+            if index is None:
+                return
+            previous = index.get(user_id)
+            if not index.update_best(user_id, score, accuracy):
+                return
+            gained = score - (previous[0] if previous else 0)
+            if gained:
+                total = self._overall.get(user_id)
+                self._overall.set(user_id, (total[0] if total else 0) + gained)
+
+        if self.mirror is not None:
+            try:
+                self.mirror.record(user_id, stage, score, accuracy)
+            except redis.RedisError as e:
+                print(f"Leaderboard Redis update failed: {e}")
+
+    def _resolve_usernames(self, user_ids):
+        missing = [user_id for user_id in user_ids if user_id not in self._usernames]
+        if missing:
+            for user_id, username in User.query.with_entities(User.id, User.username).filter(User.id.in_(missing)):
+                self._usernames[user_id] = username
+        return {user_id: self._usernames.get(user_id) for user_id in user_ids}
+
+    def standings(self, stage=None, limit=10, user_id=None):
+        """상위 limit명과 (user_id가 주어지면) 해당 사용자의 순위. 앱 컨텍스트 안에서 호출"""
+        self._ensure_refresher()
+        limit = max(1, min(limit, LEADERBOARD_MAX_LIMIT))
+        with self._lock:
+            index = self._overall if stage is None else self._stage_indexes[stage]
+            top = index.top(limit)
+            total = len(index)
+            me = None
+            if user_id is not None and index.get(user_id) is not None:
+                score, accuracy = index.get(user_id)
+                me = {'rank': index.rank(user_id), 'score': score, 'accuracy': accuracy}
+
+        if stage is None:
+            # 전체 순위는 단계별 최고 점수 합계만으로 정렬
+            top = [(entry_user_id, score, None) for entry_user_id, score, _ in top]
+            if me is not None:
+                me['accuracy'] = None
+
+        usernames = self._resolve_usernames([entry_user_id for entry_user_id, _, _ in top])
+        entries = [
+            {'rank': rank, 'username': usernames[entry_user_id], 'score': score, 'accuracy': accuracy}
+            for rank, (entry_user_id, score, accuracy) in enumerate(top, start=1)
+        ]
+        return {'stage': stage, 'total': total, 'entries': entries, 'me': me}
@@ -0,0 +1,438 @@
+"""요청 계측과 /metrics (Prometheus 텍스트 형식)
+
+라우트별 응답 시간 히스토그램, 요청 수, 요청마다의 DB 쿼리 수/시간(SQLAlchemy 이벤트),
+큐 깊이 같은 게이지를 프로세스 메모리에 모은다. METRICS_DIR이 있으면 각 워커가
+자기 값을 주기적으로 파일에 써 두고, /metrics는 살아 있는 워커들의 값을 합쳐서 보여준다.
+종료된 워커의 카운터/히스토그램은 metrics-retired.json에 더해 두므로, max_requests로
+워커가 교체되어도 합계가 줄지 않는다 (Prometheus가 카운터 리셋으로 오인하지 않음).
+METRICS_TOKEN이 없으면 /metrics는 루프백에서만 열린다.
+
+PROFILER_TOKEN을 설정하면 샘플링 프로파일러를 켤 수 있다. 모든 스레드의 스택을
+일정 간격으로 찍어 flamegraph.pl / speedscope에서 바로 읽는 collapsed 형식으로 돌려준다.
+"""
+import atexit
+import glob
+import hmac
+import ipaddress
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import fcntl
+except ImportError:  # Windows: METRICS_DIR 없이(워커 하나)만 사용 가능
+    fcntl = None
+
+METRICS_DIR = os.environ.get('METRICS_DIR')
+METRICS_SNAPSHOT_INTERVAL = float(os.environ.get('METRICS_SNAPSHOT_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN')
+PROFILER_INTERVAL_MS = float(os.environ.get('PROFILER_INTERVAL_MS', 10))
+PROFILER_MAX_SECONDS = float(os.environ.get('PROFILER_MAX_SECONDS', 60))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+HELP = {
+    'typing_http_requests_total': ('counter', '처리한 HTTP 요청 수'),
+    'typing_http_request_duration_seconds': ('histogram', '라우트별 응답 시간'),
+    'typing_db_queries_per_request': ('histogram', '요청 하나가 실행한 DB 쿼리 수'),
+    'typing_db_query_seconds_total': ('counter', '라우트별 DB 쿼리 누적 시간'),
+    'typing_db_queries_total': ('counter', '라우트별 DB 쿼리 수 (요청 밖은 route="background")'),
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class MetricsRegistry:
+    """카운터/히스토그램 저장소 (한 프로세스)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.counters = {}    # (이름, 레이블) -> 값
+        self.histograms = {}  # (이름, 레이블) -> [버킷별 개수..., 합계, 개수]
+        self.buckets = {}     # 이름 -> 버킷 상한
+        self.gauges = {}      # 이름 -> (설명, 함수)
+
+    def _check_pid(self):
+        # fork된 워커가 마스터의 값을 물려받아 중복 집계하지 않도록 비움 (잠금 안에서 호출)
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self.counters = {}
+            self.histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._check_pid()
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._check_pid()
+            self.buckets.setdefault(name, buckets)
+            data = self.histograms.get(key)
+            if data is None:
+                data = self.histograms[key] = [0] * (len(buckets) + 2)
+            for index, upper in enumerate(buckets):
+                if value <= upper:
+                    data[index] += 1
+                    break
+            data[-2] += value
+            data[-1] += 1
+
+    def gauge(self, name, description, func):
+        """수집할 때마다 func()를 호출하는 게이지 등록"""
+        self.gauges[name] = (description, func)
+
+    def snapshot(self):
+        """JSON으로 저장할 수 있는 현재 값"""
+        gauges = []
+        for name, (_, func) in self.gauges.items():
+            try:
+                gauges.append([name, float(func())])
+            except Exception:
+                continue
+        with self._lock:
+            self._check_pid()
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(data)] for (name, labels), data in self.histograms.items()],
+                'buckets': {name: list(buckets) for name, buckets in self.buckets.items()},
+                'gauges': gauges,
+            }
+
+
+def merge_snapshots(snapshots):
+    """여러 워커의 snapshot() 결과를 합산"""
+    counters = {}
+    histograms = {}
+    buckets = {}
+    gauges = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0) + value
+        buckets.update(snapshot['buckets'])
+        for name, labels, data in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.get(key)
+            histograms[key] = list(data) if merged is None else [a + b for a, b in zip(merged, data)]
+        for name, value in snapshot['gauges']:
+            gauges[name] = gauges.get(name, 0) + value
+    return counters, histograms, buckets, gauges
+
+
+def render_prometheus(snapshots, gauge_help, workers):
+    """합산한 값을 Prometheus 텍스트 형식으로"""
+    counters, histograms, buckets, gauges = merge_snapshots(snapshots)
+    lines = []
+
+    def header(name, kind, text):
+        lines.append(f'# HELP {name} {text}')
+        lines.append(f'# TYPE {name} {kind}')
+
+    for metric in sorted({name for name, _ in counters}):
+        header(metric, 'counter', HELP.get(metric, ('', metric))[1])
+        for (name, labels), value in sorted(counters.items()):
+            if name == metric:
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+    for metric in sorted({name for name, _ in histograms}):
+        header(metric, 'histogram', HELP.get(metric, ('', metric))[1])
+        for (name, labels), data in sorted(histograms.items()):
+            if name != metric:
+                continue
+            running = 0
+            for upper, count in zip(buckets[metric], data[:-2]):
+                running += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", _format_value(float(upper)))])} {running}')
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {data[-1]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(round(data[-2], 6))}')
+            lines.append(f'{name}_count{_format_labels(labels)} {data[-1]}')
+
+    for name in sorted(gauges):
+        header(name, 'gauge', gauge_help.get(name, name))
+        lines.append(f'{name} {_format_value(gauges[name])}')
+
+    header('typing_metrics_workers', 'gauge', '값을 합산한 워커 프로세스 수')
+    lines.append(f'typing_metrics_workers {workers}')
+    return '\n'.join(lines) + '\n'
+
+
+def _to_snapshot(counters, histograms, buckets):
+    """merge_snapshots() 결과를 다시 snapshot() 형식으로"""
+    return {
+        'counters': [[name, [list(pair) for pair in labels], value] for (name, labels), value in counters.items()],
+        'histograms': [[name, [list(pair) for pair in labels], data] for (name, labels), data in histograms.items()],
+        'buckets': buckets,
+        'gauges': [],
+    }
+
+
+class SnapshotStore:
+    """워커별 스냅샷 파일
+
+    metrics-<ID>.json: 워커 하나의 값, metrics-<ID>.lock: 그 워커가 살아 있는 동안 flock을 잡는 파일
+    metrics-retired.json: 종료된 워커들의 카운터/히스토그램 합계
+    (PID는 워커 교체 뒤 재사용될 수 있어 프로세스마다 새로 만든 ID를 씀)
+    """
+
+    RETIRED = 'metrics-retired'
+
+    def __init__(self, directory):
+        if fcntl is None:
+            raise RuntimeError('METRICS_DIR는 fcntl(flock)이 있는 환경에서만 쓸 수 있습니다.')
+        self.directory = directory
+        self._id_lock = threading.Lock()
+        self._pid = None
+        self._worker_id = None
+        self._lock_file = None
+
+    def path(self, name, suffix='.json'):
+        return os.path.join(self.directory, f'{name}{suffix}')
+
+    @property
+    def worker_id(self):
+        # fork된 워커마다 자기 ID와 잠금 파일을 새로 만듦
+        if self._pid != os.getpid():
+            with self._id_lock:
+                if self._pid != os.getpid():
+                    os.makedirs(self.directory, exist_ok=True)
+                    worker_id = f'metrics-{uuid.uuid4().hex}'
+                    lock_path = self.path(worker_id, '.lock')
+                    # 잠근 뒤에 이름을 바꿔, 다른 워커가 잠기지 않은 잠금 파일을 보지 않게 함
+                    self._lock_file = open(lock_path + '.tmp', 'a')
+                    fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    os.rename(lock_path + '.tmp', lock_path)
+                    self._worker_id = worker_id
+                    self._pid = os.getpid()
+        return self._worker_id
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, path, snapshot):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, path)
+
+    def write(self, snapshot):
+        self._write(self.path(self.worker_id), snapshot)
+
+    def _retire(self, worker_id):
+        """종료된 워커의 마지막 값을 retired 합계에 더하고 파일 정리 (잠금 파일의 flock을 잡은 상태에서 호출)"""
+        snapshot = self._read(self.path(worker_id))
+        if snapshot is not None:
+            with open(self.path(self.RETIRED, '.lock'), 'a') as lock:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+                retired = self._read(self.path(self.RETIRED))
+                counters, histograms, buckets, _ = merge_snapshots([s for s in (retired, snapshot) if s])
+                self._write(self.path(self.RETIRED), _to_snapshot(counters, histograms, buckets))
+                os.remove(self.path(worker_id))
+        os.remove(self.path(worker_id, '.lock'))
+
+    def read_others(self):
+        """다른 살아 있는 워커들의 스냅샷 목록과 종료된 워커들의 합계(없으면 None)"""
+        snapshots = []
+        own = self.worker_id
+        for lock_path in glob.glob(os.path.join(self.directory, 'metrics-*.lock')):
+            worker_id = os.path.basename(lock_path)[:-len('.lock')]
+            if worker_id in (own, self.RETIRED):
+                continue
+            try:
+                lock = open(lock_path)
+            except FileNotFoundError:
+                continue
+            with lock:
+                try:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # 살아 있는 워커
+                    snapshot = self._read(self.path(worker_id))
+                    if snapshot is not None:
+                        snapshots.append(snapshot)
+                    continue
+                # 잠금을 잡기 전에 다른 워커가 이미 정리했으면 건너뜀
+                try:
+                    if os.stat(lock_path).st_ino == os.fstat(lock.fileno()).st_ino:
+                        self._retire(worker_id)
+                except FileNotFoundError:
+                    pass
+        return snapshots, self._read(self.path(self.RETIRED))
+
+
+class SamplingProfiler:
+    """모든 스레드의 스택을 주기적으로 수집해 collapsed 스택 형식으로 집계"""
+
+    def __init__(self, interval_ms=PROFILER_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stack(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def sample(self, seconds):
+        """seconds 동안 샘플링해서 'a;b;c 개수' 줄들로 반환 (동시에 하나만 실행)"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            me = threading.get_ident()
+            stacks = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id != me:
+                        stacks[self._stack(frame)] += 1
+                time.sleep(self.interval)
+            return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
+
+
+class RequestMetrics:
+    """Flask 앱에 요청 계측을 붙이고 /metrics 내용 생성"""
+
+    def __init__(self, app, metrics_dir=METRICS_DIR, snapshot_interval=METRICS_SNAPSHOT_INTERVAL):
+        self.registry = MetricsRegistry()
+        self.store = SnapshotStore(metrics_dir) if metrics_dir else None
+        self.snapshot_interval = snapshot_interval
+        self._snapshot_at = 0.0
+        self.profiler = SamplingProfiler()
+        if self.store is not None:
+            # 정상 종료(max_requests 교체 등)하는 워커는 마지막 값을 남김
+            atexit.register(self._write_final_snapshot)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def gauge(self, name, description, func):
+        self.registry.gauge(name, description, func)
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.db_queries = 0
+        g.db_seconds = 0.0
+
+    def _after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        # URL 그대로가 아니라 규칙(/game/<int:stage>)으로 묶어 레이블 수를 제한
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        labels = {'route': route, 'method': request.method}
+        registry = self.registry
+        registry.inc('typing_http_requests_total', {**labels, 'status': response.status_code})
+        registry.observe('typing_http_request_duration_seconds', labels, elapsed, LATENCY_BUCKETS)
+        registry.observe('typing_db_queries_per_request', labels, g.db_queries, QUERY_COUNT_BUCKETS)
+        if g.db_queries:
+            registry.inc('typing_db_queries_total', {'route': route}, g.db_queries)
+            registry.inc('typing_db_query_seconds_total', {'route': route}, g.db_seconds)
+        self._maybe_write_snapshot()
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('metrics_query_started')
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        if has_request_context() and 'db_queries' in g:
+            g.db_queries += 1
+            g.db_seconds += elapsed
+        else:
+            # 수집 writer, 텔레메트리 병합 등 요청 밖의 쿼리
+            self.registry.inc('typing_db_queries_total', {'route': 'background'})
+            self.registry.inc('typing_db_query_seconds_total', {'route': 'background'}, elapsed)
+
+    def _maybe_write_snapshot(self):
+        if self.store is None:
+            return
+        now = time.monotonic()
+        if now - self._snapshot_at < self.snapshot_interval:
+            return
+        self._snapshot_at = now
+        try:
+            self.store.write(self.registry.snapshot())
+        except OSError as e:
+            print(f"Metrics snapshot write failed: {e}")
+
+    def _write_final_snapshot(self):
+        # 요청을 처리한 적 있는 워커만 (preload된 마스터는 파일을 만들지 않음)
+        if self.registry._pid == os.getpid() and (self.registry.counters or self.registry.histograms):
+            try:
+                self.store.write(self.registry.snapshot())
+            except OSError as e:
+                print(f"Metrics snapshot write failed: {e}")
+
+    def render(self):
+        snapshots = [self.registry.snapshot()]
+        workers = 1
+        if self.store is not None:
+            others, retired = self.store.read_others()
+            snapshots.extend(others)
+            workers += len(others)
+            if retired is not None:
+                snapshots.append(retired)
+        gauge_help = {name: description for name, (description, _) in self.registry.gauges.items()}
+        return render_prometheus(snapshots, gauge_help, workers)
+
+
+def _is_loopback(address):
+    try:
+        return ipaddress.ip_address(address).is_loopback
+    except ValueError:
+        return False
+
+
+def token_allowed(expected):
+    """Authorization: Bearer 또는 ?token= 값을 토큰과 비교. 토큰이 없으면 루프백에서 온 요청만 허용"""
+    if not expected:
+        return _is_loopback(request.remote_addr or '')
+    header = request.headers.get('Authorization', '')
+    provided = header[len('Bearer '):] if header.startswith('Bearer ') else request.args.get('token', '')
+    # str끼리 비교하면 ASCII가 아닌 값에서 TypeError가 나므로 바이트로 비교
+    return hmac.compare_digest(provided.encode('utf-8', 'surrogatepass'), expected.encode('utf-8', 'surrogatepass'))
@@ -0,0 +1,129 @@
+"""데이터베이스 모델"""
+from datetime import datetime
+
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+# 데이터베이스 모델
+class User(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(80), unique=True, nullable=False)
+    email = db.Column(db.String(120), unique=True, nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
+    current_stage = db.Column(db.Integer, default=1)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class GameSession(db.Model):
+    __table_args__ = (
+        # 사용자별 기록 조회(전체/단계별)를 최신순으로 키셋 페이지네이션하기 위한 인덱스
+        db.Index('ix_game_session_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_game_session_user_stage_created', 'user_id', 'stage', 'created_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    stage = db.Column(db.Integer, nullable=False)
+    score = db.Column(db.Integer, default=0)
+    accuracy = db.Column(db.Float, default=0.0)
+    words_completed = db.Column(db.Integer, default=0)
+    words_missed = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'stage': self.stage,
+            'score': self.score,
+            'accuracy': self.accuracy,
+            'words_completed': self.words_completed,
+            'words_missed': self.words_missed,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+        }
+
+class GameSessionDaily(db.Model):
+    """보존 기간이 지난 게임 세션을 사용자/단계/날짜(UTC)별로 합친 기록 (archive.py)"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    stage = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    sessions = db.Column(db.Integer, nullable=False, default=0)
+    best_score = db.Column(db.Integer, nullable=False, default=0)
+    best_accuracy = db.Column(db.Float, nullable=False, default=0.0)
+    total_score = db.Column(db.BigInteger, nullable=False, default=0)
+    total_accuracy = db.Column(db.Float, nullable=False, default=0.0)
+    words_completed = db.Column(db.BigInteger, nullable=False, default=0)
+    words_missed = db.Column(db.BigInteger, nullable=False, default=0)
+    last_played_at = db.Column(db.DateTime)
+
+class UserStageStats(db.Model):
+    """사용자/단계별 누적 통계 (게임 세션 저장 시 증분 갱신)"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    stage = db.Column(db.Integer, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    best_score = db.Column(db.Integer, nullable=False, default=0)
+    best_accuracy = db.Column(db.Float, nullable=False, default=0.0)
+    total_score = db.Column(db.BigInteger, nullable=False, default=0)
+    total_accuracy = db.Column(db.Float, nullable=False, default=0.0)
+    recent_score = db.Column(db.Float, nullable=False, default=0.0)  # 지수이동평균
+    recent_accuracy = db.Column(db.Float, nullable=False, default=0.0)
+    last_played_at = db.Column(db.DateTime)
+    
+    @property
+    def avg_score(self):
+        return self.total_score / self.attempts if self.attempts else 0.0
+    
+    @property
+    def avg_accuracy(self):
+        return self.total_accuracy / self.attempts if self.attempts else 0.0
+    
+    def to_dict(self):
+        return {
+            'stage': self.stage,
+            'attempts': self.attempts,
+            'best_score': self.best_score,
+            'best_accuracy': self.best_accuracy,
+            'avg_score': round(self.avg_score, 1),
+            'avg_accuracy': round(self.avg_accuracy, 1),
+            'recent_score': round(self.recent_score, 1),
+            'recent_accuracy': round(self.recent_accuracy, 1),
+            'last_played_at': self.last_played_at.isoformat() if self.last_played_at else None,
+        }
+
+class KeystrokeStat(db.Model):
+    """사용자/바이그램별 키 입력 지연 히스토그램과 오타 수 (원본 이벤트는 저장하지 않음)"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    bigram = db.Column(db.String(8), primary_key=True)
+    histogram = db.Column(db.LargeBinary, nullable=False)  # 고정 크기 버킷 카운트 (telemetry.py)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Integer, nullable=False, default=0)
+    latency_total = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SubmittedResult(db.Model):
+    """클라이언트가 붙인 결과 멱등성 키 (오프라인 큐 재전송 시 중복 저장 방지)"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class IngestCheckpoint(db.Model):
+    """스풀 ID별로 저장을 마친 마지막 seq (결과와 같은 트랜잭션에서 갱신, ingest.py)"""
+    spool_id = db.Column(db.String(32), primary_key=True)
+    seq = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+def insert_ignoring_duplicates(model):
+    """이미 있는 기본 키는 건너뛰는 INSERT (SQLite/PostgreSQL)"""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert(model).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+        return postgresql_insert(model).on_conflict_do_nothing()
+    return db.insert(model)
+
+def ensure_indexes():
+    """create_all()은 이미 있는 테이블에 인덱스를 추가하지 않으므로 따로 생성"""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
@@ -0,0 +1,361 @@
+"""실시간 레이스 모드 (WebSocket 사이드카)
+
+    python race.py
+
+같은 단계를 고른 플레이어들을 방으로 묶어 같은 단어 목록을 주고 누가 먼저 끝까지
+입력하는지 겨룬다. 이벤트 루프 하나가 모든 방을 처리한다.
+
+- 입력은 서버가 판정한다: 클라이언트는 입력한 단어만 보내고, 서버가 다음 단어와 비교한다.
+- 진행 상황은 바로 보내지 않고 RACE_TICK_HZ 주기로 모은다. 틱마다 바뀐 방만 골라
+  방마다 메시지를 한 번만 인코딩해 그 방의 연결들에 그대로 보낸다 (방 크기는 상한이 있음).
+- 로비 대기/경기 제한 시간은 힙으로 관리해 틱마다 전체 방을 훑지 않는다.
+- 결과는 일반 게임과 같은 수집기(result_ingestor)로 GameSession에 저장된다.
+- 리더보드 갱신이 웹 워커에 바로 보이려면 REDIS_URL이 필요하다 (없으면 웹 워커는
+  LEADERBOARD_REFRESH_SECONDS마다 DB에서 다시 읽을 때 반영). 그래서 REDIS_URL이 없으면
+  시작하지 않는다 (개발 중에는 RACE_REQUIRE_REDIS=false).
+- 스풀(INGEST_DURABILITY)을 쓰면 INGEST_SPOOL_DIR은 웹 서버와 다른 디렉터리로 둔다.
+
+메시지 (JSON 배열)
+    서버 -> 클라이언트
+        ["l", 방 번호, [[슬롯, 이름], ...], 시작까지 남은 초 또는 null]    로비
+        ["s", 단어 목록, 카운트다운 ms, 제한 시간 초, [[슬롯, 이름], ...], 내 슬롯]
+        ["t", [[슬롯, 완료 단어 수, 오타 수], ...]]                        바뀐 플레이어만
+        ["e", [[슬롯, 이름, 완료, 오타, 점수, 정확도, 순위], ...]]
+    클라이언트 -> 서버
+        입력한 단어 (문자열 그대로)
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import random
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs, urlsplit
+
+import websockets
+
+from app import STAGE_CONFIG, app, corpus, init_database, leaderboard, result_ingestor
+from ingest import QueueFullError, ValidationError, validate_result
+from models import User
+
+RACE_HOST = os.environ.get('RACE_HOST', '0.0.0.0')
+RACE_PORT = int(os.environ.get('RACE_PORT', 8765))
+RACE_PATH = os.environ.get('RACE_PATH', '/ws/race')
+RACE_TICK_HZ = float(os.environ.get('RACE_TICK_HZ', 10))
+RACE_ROOM_SIZE = int(os.environ.get('RACE_ROOM_SIZE', 4))
+RACE_MIN_PLAYERS = int(os.environ.get('RACE_MIN_PLAYERS', 2))
+RACE_LOBBY_SECONDS = float(os.environ.get('RACE_LOBBY_SECONDS', 10))
+RACE_COUNTDOWN_SECONDS = float(os.environ.get('RACE_COUNTDOWN_SECONDS', 3))
+RACE_TIME_LIMIT = float(os.environ.get('RACE_TIME_LIMIT', 90))
+RACE_WORDS = int(os.environ.get('RACE_WORDS', 25))
+RACE_REQUIRE_REDIS = os.environ.get('RACE_REQUIRE_REDIS', 'true').lower() == 'true'
+
+# 완주 순위 보너스 (1등부터)
+FINISH_BONUS = (300, 200, 100)
+
+CLOSE_NOT_LOGGED_IN = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_NOT_FOUND = 4404
+
+
+def encode(message):
+    return json.dumps(message, ensure_ascii=False, separators=(',', ':'))
+
+
+def load_session(cookie_header):
+    """Flask 세션 쿠키를 앱과 같은 SECRET_KEY로 검증해 dict로 반환 (실패하면 None)"""
+    if not cookie_header:
+        return None
+    cookie = SimpleCookie()
+    cookie.load(cookie_header)
+    morsel = cookie.get(app.config['SESSION_COOKIE_NAME'])
+    if morsel is None:
+        return None
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        return serializer.loads(morsel.value, max_age=int(app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return None
+
+
+def current_stage(user_id):
+    with app.app_context():
+        user = User.query.get(user_id)
+        return user.current_stage if user else None
+
+
+def record_result(user_id, username, result):
+    """일반 게임 결과와 같은 경로로 저장 (스레드 풀에서 실행)"""
+    try:
+        result = validate_result(result, STAGE_CONFIG)
+        result_ingestor.submit(user_id, result)
+    except (ValidationError, QueueFullError) as e:
+        print(f"Race result for user {user_id} not recorded: {e}")
+        return
+    leaderboard.record(user_id, result['stage'], result['score'], result['accuracy'], username)
+
+
+class Player:
+    __slots__ = ('websocket', 'user_id', 'username', 'slot', 'completed', 'missed', 'chars', 'finished_rank')
+
+    def __init__(self, websocket, user_id, username):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.username = username
+        self.slot = None
+        self.completed = 0
+        self.missed = 0
+        self.chars = 0
+        self.finished_rank = None
+
+    def score(self):
+        bonus = FINISH_BONUS[self.finished_rank - 1] if self.finished_rank and self.finished_rank <= len(FINISH_BONUS) else 0
+        return self.chars * 10 + bonus
+
+    def accuracy(self):
+        attempts = self.completed + self.missed
+        return round(self.completed / attempts * 100, 1) if attempts else 0.0
+
+
+class Room:
+    __slots__ = ('id', 'stage', 'players', 'sockets', 'state', 'words', 'lobby_deadline',
+                 'starts_at', 'deadline', 'finished', 'dirty')
+
+    def __init__(self, room_id, stage, lobby_deadline):
+        self.id = room_id
+        self.stage = stage
+        self.players = []
+        self.sockets = []
+        self.state = 'lobby'
+        self.words = []
+        self.lobby_deadline = lobby_deadline
+        self.starts_at = None
+        self.deadline = None
+        self.finished = 0
+        self.dirty = set()
+
+    def roster(self):
+        return [[player.slot, player.username] for player in self.players]
+
+
+class RaceServer:
+    """방 배정, 틱 브로드캐스트, 결과 기록"""
+
+    def __init__(self, loop_time=time.monotonic):
+        self.now = loop_time
+        self.rooms = {}
+        self.forming = {}       # 단계 -> 로비 방
+        self.dirty_rooms = set()
+        self.timers = []        # (시각, 순번, 방 번호, 종류)
+        self._room_ids = itertools.count(1)
+        self._timer_seq = itertools.count()
+        self.rng = random.Random()
+        self.ticks = 0
+
+    def _schedule(self, when, room, kind):
+        heapq.heappush(self.timers, (when, next(self._timer_seq), room.id, kind))
+
+    def broadcast(self, room, message):
+        websockets.broadcast(room.sockets, encode(message))
+
+    def join(self, player, stage):
+        room = self.forming.get(stage)
+        if room is None:
+            room = Room(next(self._room_ids), stage, self.now() + RACE_LOBBY_SECONDS)
+            self.rooms[room.id] = room
+            self.forming[stage] = room
+            self._schedule(room.lobby_deadline, room, 'lobby')
+        player.slot = max((p.slot for p in room.players), default=-1) + 1
+        room.players.append(player)
+        room.sockets.append(player.websocket)
+
+        if len(room.players) >= RACE_ROOM_SIZE:
+            self.start(room)
+        else:
+            self.broadcast_lobby(room)
+        return room
+
+    def broadcast_lobby(self, room):
+        remaining = None
+        if len(room.players) >= RACE_MIN_PLAYERS:
+            remaining = max(0, round(room.lobby_deadline - self.now()))
+        self.broadcast(room, ['l', room.id, room.roster(), remaining])
+
+    def start(self, room):
+        del self.forming[room.stage]
+        config = STAGE_CONFIG[room.stage]
+        room.words = corpus.sample(config['word_type'], RACE_WORDS, self.rng)
+        room.state = 'running'
+        room.starts_at = self.now() + RACE_COUNTDOWN_SECONDS
+        room.deadline = room.starts_at + RACE_TIME_LIMIT
+        self._schedule(room.deadline, room, 'deadline')
+        roster = room.roster()
+        for player in room.players:
+            # 내 슬롯만 다르므로 플레이어마다 보냄 (방마다 한 번뿐인 메시지)
+            websockets.broadcast([player.websocket], encode(
+                ['s', room.words, int(RACE_COUNTDOWN_SECONDS * 1000), RACE_TIME_LIMIT, roster, player.slot]
+            ))
+
+    def submit_word(self, room, player, text):
+        if room.state != 'running' or player.finished_rank or self.now() < room.starts_at:
+            return
+        if text.strip() == room.words[player.completed]:
+            player.chars += len(room.words[player.completed])
+            player.completed += 1
+            if player.completed == len(room.words):
+                room.finished += 1
+                player.finished_rank = room.finished
+        else:
+            player.missed += 1
+        room.dirty.add(player)
+        self.dirty_rooms.add(room)
+
+        if all(p.finished_rank for p in room.players):
+            self.finish(room)
+
+    def leave(self, room, player):
+        if player not in room.players:
+            return
+        room.players.remove(player)
+        room.sockets.remove(player.websocket)
+        room.dirty.discard(player)
+        if room.state == 'lobby':
+            if not room.players:
+                self.close_room(room)
+            else:
+                self.broadcast_lobby(room)
+        elif room.state == 'running':
+            # 나간 플레이어의 진행분도 기록
+            self._record(room, player)
+            if all(p.finished_rank for p in room.players):
+                self.finish(room)
+
+    def close_room(self, room):
+        room.state = 'closed'
+        self.rooms.pop(room.id, None)
+        if self.forming.get(room.stage) is room:
+            del self.forming[room.stage]
+        self.dirty_rooms.discard(room)
+
+    def _record(self, room, player):
+        if not player.completed:
+            return
+        result = {
+            'stage': room.stage,
+            'score': player.score(),
+            'accuracy': player.accuracy(),
+            'words_completed': player.completed,
+            'words_missed': player.missed,
+        }
+        asyncio.get_running_loop().run_in_executor(None, record_result, player.user_id, player.username, result)
+
+    def finish(self, room):
+        if room.state != 'running':
+            return
+        self.flush_room(room)
+        ranked = sorted(room.players, key=lambda p: (p.finished_rank or len(room.players) + 1, -p.completed, p.missed))
+        results = []
+        for rank, player in enumerate(ranked, start=1):
+            results.append([player.slot, player.username, player.completed, player.missed,
+                            player.score(), player.accuracy(), rank])
+            self._record(room, player)
+        self.broadcast(room, ['e', results])
+        self.close_room(room)
+
+    def flush_room(self, room):
+        if room.dirty:
+            self.broadcast(room, ['t', [[p.slot, p.completed, p.missed] for p in room.dirty]])
+            room.dirty.clear()
+
+    def tick(self):
+        """타이머 처리 후 바뀐 방에만 진행 상황 전송"""
+        self.ticks += 1
+        now = self.now()
+        while self.timers and self.timers[0][0] <= now:
+            _, _, room_id, kind = heapq.heappop(self.timers)
+            room = self.rooms.get(room_id)
+            if room is None:
+                continue
+            if kind == 'lobby' and room.state == 'lobby':
+                if len(room.players) >= RACE_MIN_PLAYERS:
+                    self.start(room)
+                else:
+                    # 상대가 올 때까지 로비 유지
+                    room.lobby_deadline = now + RACE_LOBBY_SECONDS
+                    self._schedule(room.lobby_deadline, room, 'lobby')
+            elif kind == 'deadline' and room.state == 'running':
+                self.finish(room)
+
+        dirty_rooms, self.dirty_rooms = self.dirty_rooms, set()
+        for room in dirty_rooms:
+            self.flush_room(room)
+
+    async def run_ticker(self):
+        interval = 1 / RACE_TICK_HZ
+        while True:
+            started = self.now()
+            self.tick()
+            await asyncio.sleep(max(0.0, interval - (self.now() - started)))
+
+    async def handler(self, websocket):
+        url = urlsplit(websocket.path)
+        if url.path != RACE_PATH:
+            await websocket.close(CLOSE_NOT_FOUND, 'Not found')
+            return
+        session = load_session(websocket.request_headers.get('Cookie'))
+        if not session or 'user_id' not in session:
+            await websocket.close(CLOSE_NOT_LOGGED_IN, 'Not logged in')
+            return
+        try:
+            stage = int(parse_qs(url.query).get('stage', [''])[0])
+        except ValueError:
+            stage = None
+        if stage not in STAGE_CONFIG:
+            await websocket.close(CLOSE_NOT_FOUND, 'Invalid stage')
+            return
+        unlocked = await asyncio.get_running_loop().run_in_executor(None, current_stage, session['user_id'])
+        if unlocked is None or stage > unlocked:
+            await websocket.close(CLOSE_FORBIDDEN, 'Stage locked')
+            return
+
+        player = Player(websocket, session['user_id'], session.get('username'))
+        room = self.join(player, stage)
+        try:
+            async for message in websocket:
+                if isinstance(message, str) and len(message) <= 200:
+                    self.submit_word(room, player, message)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.leave(room, player)
+
+
+def health_check(path, request_headers):
+    if path == '/health':
+        return 200, [('Content-Type', 'text/plain')], b'ok\n'
+    return None
+
+
+async def serve(host=RACE_HOST, port=RACE_PORT):
+    server = RaceServer()
+    ticker = asyncio.create_task(server.run_ticker())
+    async with websockets.serve(server.handler, host, port, process_request=health_check,
+                                max_size=1024, compression=None):
+        print(f"Race server listening on ws://{host}:{port}{RACE_PATH} ({RACE_TICK_HZ:g} ticks/s)")
+        try:
+            await asyncio.Future()
+        finally:
+            ticker.cancel()
+
+
+if __name__ == '__main__':
+    if leaderboard.mirror is None:
+        message = "race results reach web workers' leaderboards only on their periodic database reload"
+        if RACE_REQUIRE_REDIS:
+            raise SystemExit(f"REDIS_URL is required for race mode ({message}); set RACE_REQUIRE_REDIS=false to run without it")
+        print(f"Warning: REDIS_URL is not set; {message}")
+    # 웹 서버보다 먼저 뜨는 경우를 위해 (이미 있으면 아무것도 하지 않음)
+    init_database()
+    asyncio.run(serve())
@@ -0,0 +1,38 @@
+"""운영용 서버 실행 (gunicorn.conf.py 설정 사용)
+
+    python serve.py
+    python -c "import serve; serve.run(workers=2, bind='127.0.0.1:8000')"
+"""
+import os
+
+from gunicorn.app.base import Application
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+
+
+class TypingServer(Application):
+    """gunicorn.conf.py 위에 인자로 받은 설정을 덮어써서 실행"""
+
+    def __init__(self, options=None):
+        self.options = options or {}
+        super().__init__()
+
+    def init(self, parser, opts, args):
+        return None
+
+    def load_config(self):
+        self.load_config_from_file(CONFIG_PATH)
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app import app
+        return app
+
+
+def run(**options):
+    TypingServer(options).run()
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,89 @@
+"""앱 시작 준비와 시작 시간 보고
+
+템플릿은 처음 렌더링할 때 파싱/컴파일되므로, 새 워커의 첫 요청이 느려진다.
+JINJA_CACHE_DIR에 컴파일된 바이트코드를 저장해 새 프로세스는 컴파일 없이 불러오고,
+preload된 gunicorn 마스터에서 모든 템플릿을 미리 불러 두면 워커들은 컴파일된
+템플릿을 그대로 물려받는다.
+"""
+import os
+import tempfile
+import time
+
+from flask import g, request
+from jinja2 import FileSystemBytecodeCache
+
+# 비워 두면 디스크 바이트코드 캐시를 쓰지 않음
+JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'typing-jinja'))
+
+
+class LazyBytecodeCache(FileSystemBytecodeCache):
+    """처음 저장할 때 캐시 디렉토리를 만드는 바이트코드 캐시 (쓸 수 없으면 저장만 건너뜀)"""
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self.disabled = False
+
+    def dump_bytecode(self, bucket):
+        if self.disabled:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            super().dump_bytecode(bucket)
+        except OSError as e:
+            self.disabled = True
+            print(f"Warning: template cache disabled ({self.directory}: {e})")
+
+
+def configure_template_cache(app, cache_dir=JINJA_CACHE_DIR):
+    """컴파일된 템플릿을 디스크에 캐시 (app.jinja_env를 처음 쓰기 전에 호출, 디렉토리는 처음 저장할 때 만듦)"""
+    if not cache_dir:
+        return
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': LazyBytecodeCache(cache_dir)}
+
+
+def precompile_templates(app):
+    """모든 템플릿을 미리 불러 메모리 캐시(와 바이트코드 캐시)를 채움. 불러온 수 반환"""
+    names = app.jinja_env.list_templates(extensions=('html',))
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+class StartupReport:
+    """import부터 준비 단계별 소요 시간과 워커별 첫 요청 시간 출력"""
+
+    def __init__(self, started):
+        self.started = started
+        self.last = started
+        self.timings = []
+        self._first_request_pid = None
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.timings.append((name, now - self.last))
+        self.last = now
+
+    def report(self):
+        total = self.last - self.started
+        print("Startup timings: " + ', '.join(
+            f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.timings
+        ) + f", total={total * 1000:.0f}ms")
+
+    def watch_first_request(self, app):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        if self._first_request_pid != os.getpid():
+            g.startup_request_started = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.pop('startup_request_started', None)
+        if started is not None and self._first_request_pid != os.getpid():
+            # fork된 워커마다 한 번씩 출력
+            self._first_request_pid = os.getpid()
+            now = time.perf_counter()
+            print(f"First request in worker {os.getpid()}: {request.method} {request.path} "
+                  f"{response.status_code} in {(now - started) * 1000:.1f}ms "
+                  f"({(now - self.last):.2f}s after startup)")
+        return response
@@ -235,6 +235,55 @@ class WeatherSystem {
 }
 
 // 게임 클래스 정의
+// 키 입력 기록기 (게임 종료 시 바이너리로 한 번에 업로드)
+class KeystrokeRecorder {
+    constructor(maxEvents = 20000) {
+        this.events = [];
+        this.maxEvents = maxEvents;
+        this.lastTime = null;
+        this.lastInput = '';
+    }
+    
+    record(input, isError) {
+        const previous = this.lastInput;
+        this.lastInput = input;
+        
+        // 글자가 하나 추가된 경우만 기록 (지우기, 붙여넣기 제외)
+        if (input.length !== previous.length + 1 || this.events.length >= this.maxEvents) {
+            return;
+        }
+        
+        const now = performance.now();
+        const delta = this.lastTime === null ? 0 : Math.round(now - this.lastTime);
+        this.lastTime = now;
+        this.events.push([delta, input.codePointAt(input.length - 1), isError ? 1 : 0]);
+    }
+    
+    resetInput() {
+        this.lastInput = '';
+    }
+    
+    // 'KS' | 버전 | 단계 | 이벤트 수 | (시간차, 문자 코드 << 1 | 오타) 반복, 모두 varint
+    encode(stage) {
+        const bytes = [0x4B, 0x53, 1];
+        const writeVarint = (value) => {
+            while (value >= 0x80) {
+                bytes.push((value % 0x80) | 0x80);
+                value = Math.floor(value / 0x80);
+            }
+            bytes.push(value);
+        };
+        
+        writeVarint(stage);
+        writeVarint(this.events.length);
+        for (const [delta, code, error] of this.events) {
+            writeVarint(delta);
+            writeVarint(code * 2 + error);
+        }
+        return new Uint8Array(bytes);
+    }
+}
+
 class TypingGame {
     constructor(config) {
         this.config = config;
@@ -251,6 +300,7 @@ class TypingGame {
         this.isPaused = false;
         this.gameInterval = null;
         this.wordInterval = null;
+        this.keystrokes = new KeystrokeRecorder();
         
         this.gameArea = document.getElementById('gameArea');
         this.wordsContainer = document.getElementById('wordsContainer');
@@ -264,9 +314,33 @@ class TypingGame {
         this.loadWords();
     }
     
+    wordsUrl() {
+        // 약점 맞춤 연습 게임은 사용자별 단어 요청
+        if (this.config.adaptive) {
+            return `/api/words/${this.config.stage}/drill`;
+        }
+        // 미리 만들어진 번들 중 하나를 골라 요청 (브라우저/nginx 캐시 적중)
+        if (this.config.bundleCount > 0) {
+            const bundleId = Math.floor(Math.random() * this.config.bundleCount);
+            return `/api/words/${this.config.stage}/bundle/${bundleId}?v=${this.config.bundleVersion}`;
+        }
+        return `/api/words/${this.config.stage}`;
+    }
+    
     async loadWords() {
+        // 서비스 워커가 미리 받아 둔 번들이 있으면 네트워크 없이 바로 시작
+        if (!this.config.adaptive && this.config.bundleCount > 0) {
+            const bundle = await offlineStore.takeBundle(this.config.stage, this.config.bundleVersion).catch(() => null);
+            if (bundle) {
+                this.words = bundle.words;
+                this.config = { ...this.config, ...bundle.config };
+                this.startGame();
+                return;
+            }
+        }
+        
         try {
-            const response = await fetch(`/api/words/${this.config.stage}`);
+            const response = await fetch(this.wordsUrl());
             const data = await response.json();
             this.words = data.words;
             this.config = { ...this.config, ...data.config };
@@ -426,11 +500,13 @@ class TypingGame {
             
             targetWord.element.classList.add('typing');
             this.updateInputFeedback('correct', '올바른 입력');
+            this.keystrokes.record(input, false);
             
             // 완전히 일치하는지 확인
             if (trimmedInput === targetWord.text.toLowerCase()) {
                 this.completeWord(targetWord);
                 this.typingInput.value = '';
+                this.keystrokes.resetInput();
             }
         } else {
             // 일치하는 단어가 없는 경우
@@ -439,6 +515,8 @@ class TypingGame {
                 word.element.classList.remove('typing');
             });
             
+            this.keystrokes.record(input, trimmedInput.length > 0);
+            
             if (trimmedInput.length > 0) {
                 this.updateInputFeedback('incorrect', '일치하는 단어가 없습니다');
                 this.totalChars++;
@@ -469,6 +547,7 @@ class TypingGame {
         }
         
         this.typingInput.value = '';
+        this.keystrokes.resetInput();
     }
     
     completeWord(wordData) {
@@ -690,6 +769,7 @@ class TypingGame {
         
         // 서버에 결과 전송
         this.saveProgress();
+        this.uploadKeystrokes();
         
         // 완료 모달을 직접 표시 (Bootstrap Modal 사용하지 않음)
         const modalElement = document.getElementById('gameCompleteModal');
@@ -720,6 +800,9 @@ class TypingGame {
         // 남은 모든 단어 정리
         this.cleanupAllWords();
         
+        // 게임 오버여도 키 입력 기록은 분석에 사용
+        this.uploadKeystrokes();
+        
         const accuracy = this.totalChars > 0 ? (this.correctChars / this.totalChars * 100) : 100;
         
         // 게임 오버 통계 표시
@@ -739,22 +822,47 @@ class TypingGame {
         }
     }
     
+    uploadKeystrokes() {
+        if (this.keystrokes.events.length === 0) return;
+        
+        fetch('/api/keystrokes', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/octet-stream' },
+            body: this.keystrokes.encode(this.config.stage)
+        }).catch(error => {
+            console.error('키 입력 기록 전송 실패:', error);
+        });
+    }
+    
     async saveProgress() {
         const accuracy = this.totalChars > 0 ? (this.correctChars / this.totalChars * 100) : 100;
+        const result = {
+            stage: this.config.stage,
+            score: this.score,
+            accuracy: accuracy,
+            words_completed: this.completedWords,
+            words_missed: this.missedWords
+        };
         
+        // 결과는 오프라인 큐에 넣고 일괄 전송 (연결이 끊겨도 나중에 다시 보냄)
         try {
-            await apiCall('/api/complete-stage', {
-                method: 'POST',
-                body: JSON.stringify({
-                    stage: this.config.stage,
-                    score: this.score,
-                    accuracy: accuracy,
-                    words_completed: this.completedWords,
-                    words_missed: this.missedWords
-                })
-            });
+            await offlineStore.enqueueResult(this.config.userId, result);
         } catch (error) {
-            console.error('진행상황 저장 실패:', error);
+            // IndexedDB를 쓸 수 없으면 바로 전송
+            try {
+                await apiCall('/api/complete-stage', {
+                    method: 'POST',
+                    body: JSON.stringify(result)
+                });
+            } catch (error) {
+                console.error('진행상황 저장 실패:', error);
+            }
+            return;
+        }
+        
+        const data = await offlineStore.flushResults().catch(() => null);
+        if (data === null) {
+            showNotification('오프라인 상태입니다. 결과는 연결되면 자동으로 저장됩니다.', 'warning');
         }
     }
 }
@@ -89,6 +89,32 @@ async function apiCall(url, options = {}) {
     }
 }
 
+// 로그인/회원가입 요청 (서버가 바쁘거나(503) 한도를 넘으면(429) Retry-After만큼 기다렸다가 다시 보냄)
+const AUTH_MAX_RETRIES = 4;
+const AUTH_MAX_RETRY_WAIT = 30;
+
+async function postWithRetry(url, body, onRetry) {
+    for (let attempt = 0; ; attempt++) {
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(body)
+        });
+        if ((response.status !== 503 && response.status !== 429) || attempt >= AUTH_MAX_RETRIES) {
+            return response;
+        }
+        const retryAfter = parseFloat(response.headers.get('Retry-After')) || 1;
+        if (retryAfter > AUTH_MAX_RETRY_WAIT) {
+            return response;
+        }
+        if (onRetry) {
+            onRetry(retryAfter);
+        }
+        // 한꺼번에 거절된 요청들이 같은 순간에 다시 몰리지 않도록 조금씩 어긋나게 기다림
+        await new Promise(resolve => setTimeout(resolve, (retryAfter + Math.random() * retryAfter) * 1000));
+    }
+}
+
 // 키보드 이벤트 처리
 function setupKeyboardShortcuts() {
     document.addEventListener('keydown', function(e) {
@@ -0,0 +1,213 @@
+// 오프라인 지원: 단어 번들 미리 받기(IndexedDB)와 스테이지 결과 전송 큐
+// 게임/대시보드 페이지와 서비스 워커(sw.js)가 함께 사용
+const OFFLINE_DB_NAME = 'typing-offline';
+const OFFLINE_DB_VERSION = 1;
+const PREFETCH_BUNDLES_PER_STAGE = 4;
+const RESULT_BATCH_SIZE = 50;                           // 서버 INGEST_BATCH_MAX_RESULTS 이하
+const RESULT_MAX_AGE_MS = 7 * 24 * 60 * 60 * 1000;      // 서버 INGEST_MAX_RESULT_AGE_DAYS
+const RESULT_SYNC_TAG = 'typing-results';
+
+class OfflineStore {
+    constructor() {
+        this.dbPromise = null;
+        this.flushing = null;
+    }
+
+    open() {
+        if (!this.dbPromise) {
+            this.dbPromise = new Promise((resolve, reject) => {
+                if (typeof indexedDB === 'undefined') {
+                    reject(new Error('IndexedDB를 지원하지 않습니다.'));
+                    return;
+                }
+                const request = indexedDB.open(OFFLINE_DB_NAME, OFFLINE_DB_VERSION);
+                request.onupgradeneeded = () => {
+                    const db = request.result;
+                    const bundles = db.createObjectStore('bundles', { keyPath: ['stage', 'bundleId'] });
+                    bundles.createIndex('stage', 'stage');
+                    db.createObjectStore('results', { keyPath: 'id' });
+                };
+                request.onsuccess = () => resolve(request.result);
+                request.onerror = () => reject(request.error);
+            });
+        }
+        return this.dbPromise;
+    }
+
+    // 트랜잭션 하나에서 callback(store) 실행, 완료되면 callback이 돌려준 요청의 결과로 resolve
+    async run(storeName, mode, callback) {
+        const db = await this.open();
+        return new Promise((resolve, reject) => {
+            const tx = db.transaction(storeName, mode);
+            const request = callback(tx.objectStore(storeName));
+            tx.oncomplete = () => resolve(request ? request.result : undefined);
+            tx.onerror = () => reject(tx.error);
+            tx.onabort = () => reject(tx.error);
+        });
+    }
+
+    stageBundles(stage) {
+        return this.run('bundles', 'readonly', (store) => store.index('stage').getAll(stage));
+    }
+
+    // 현재 버전의 번들 하나를 꺼내고 지움 (다음 게임은 다른 번들, 빈 자리는 다음 prefetch가 채움)
+    async takeBundle(stage, version) {
+        const bundles = (await this.stageBundles(stage)).filter((bundle) => bundle.version === version);
+        if (bundles.length === 0) {
+            return null;
+        }
+        const bundle = bundles[Math.floor(Math.random() * bundles.length)];
+        await this.run('bundles', 'readwrite', (store) => store.delete([stage, bundle.bundleId]));
+        return bundle;
+    }
+
+    // 단계별로 번들을 PREFETCH_BUNDLES_PER_STAGE개까지 채움 (버전이 바뀐 번들은 버림)
+    async prefetch(stages) {
+        for (const stage of stages) {
+            try {
+                const manifestResponse = await fetch(`/api/words/${stage}/bundles`);
+                if (!manifestResponse.ok) {
+                    continue;
+                }
+                const manifest = await manifestResponse.json();
+                const cached = await this.stageBundles(stage);
+                const stale = cached.filter((bundle) => bundle.version !== manifest.version);
+                if (stale.length > 0) {
+                    await this.run('bundles', 'readwrite', (store) => {
+                        stale.forEach((bundle) => store.delete([stage, bundle.bundleId]));
+                    });
+                }
+
+                const have = new Set(cached.filter((bundle) => bundle.version === manifest.version)
+                    .map((bundle) => bundle.bundleId));
+                const candidates = [];
+                for (let bundleId = 0; bundleId < manifest.bundle_count; bundleId++) {
+                    if (!have.has(bundleId)) {
+                        candidates.push(bundleId);
+                    }
+                }
+                while (have.size < Math.min(PREFETCH_BUNDLES_PER_STAGE, manifest.bundle_count) && candidates.length > 0) {
+                    const bundleId = candidates.splice(Math.floor(Math.random() * candidates.length), 1)[0];
+                    // 번들 URL은 버전별로 고정이라 브라우저/nginx 캐시에 적중
+                    const response = await fetch(`/api/words/${stage}/bundle/${bundleId}?v=${manifest.version}`);
+                    if (!response.ok) {
+                        break;
+                    }
+                    const data = await response.json();
+                    await this.run('bundles', 'readwrite', (store) => store.put({
+                        stage: stage,
+                        bundleId: bundleId,
+                        version: data.version,
+                        config: data.config,
+                        words: data.words
+                    }));
+                    have.add(bundleId);
+                }
+            } catch (error) {
+                console.error(`단어 번들 미리 받기 실패 (stage ${stage}):`, error);
+            }
+        }
+    }
+
+    newResultId() {
+        if (self.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        const bytes = crypto.getRandomValues(new Uint8Array(16));
+        return Array.from(bytes, (b) => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    enqueueResult(userId, result) {
+        const entry = { ...result, id: this.newResultId(), user_id: userId, played_at: Date.now() };
+        return this.run('results', 'readwrite', (store) => store.put(entry));
+    }
+
+    removeResults(ids) {
+        return this.run('results', 'readwrite', (store) => {
+            ids.forEach((id) => store.delete(id));
+        });
+    }
+
+    // 쌓인 결과를 RESULT_BATCH_SIZE개씩 전송. 서버가 처리한 것(저장/중복/거부)만 큐에서 지움
+    // 마지막 응답을 돌려주고, 네트워크 오류면 null
+    flushResults() {
+        if (!this.flushing) {
+            this.flushing = this.sendResults().finally(() => {
+                this.flushing = null;
+            });
+        }
+        return this.flushing;
+    }
+
+    async sendResults() {
+        const pending = await this.run('results', 'readonly', (store) => store.getAll());
+        const expired = pending.filter((entry) => Date.now() - entry.played_at > RESULT_MAX_AGE_MS);
+        if (expired.length > 0) {
+            await this.removeResults(expired.map((entry) => entry.id));
+        }
+        const queue = pending.filter((entry) => Date.now() - entry.played_at <= RESULT_MAX_AGE_MS);
+
+        let data = { success: true };
+        for (let start = 0; start < queue.length; start += RESULT_BATCH_SIZE) {
+            try {
+                const response = await fetch('/api/complete-stages', {
+                    method: 'POST',
+                    credentials: 'same-origin',
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ results: queue.slice(start, start + RESULT_BATCH_SIZE) })
+                });
+                data = await response.json();
+            } catch (error) {
+                // 네트워크가 끊김 -> 연결되면 서비스 워커가 다시 보냄
+                this.requestSync();
+                return null;
+            }
+
+            const done = [
+                ...(data.accepted || []),
+                ...(data.duplicates || []),
+                ...(data.rejected || []).map((item) => item.id)
+            ].filter((id) => id);
+            if (done.length > 0) {
+                await this.removeResults(done);
+            }
+            if (!data.success) {
+                this.requestSync();
+                return data;
+            }
+        }
+        return data;
+    }
+
+    requestSync() {
+        // 페이지에서만 등록 가능 (Background Sync를 지원하지 않으면 다음 페이지 로드/online 이벤트 때 전송)
+        if (typeof window === 'undefined' || !('serviceWorker' in navigator)) {
+            return;
+        }
+        navigator.serviceWorker.ready
+            .then((registration) => registration.sync && registration.sync.register(RESULT_SYNC_TAG))
+            .catch(() => {});
+    }
+}
+
+const offlineStore = new OfflineStore();
+
+// 페이지에서 호출: 서비스 워커 등록, 남은 결과 전송, 지정한 단계 번들 미리 받기
+function startOfflineSupport(stages) {
+    if (typeof indexedDB === 'undefined') {
+        return;
+    }
+
+    // updateViaCache: 'none' -> sw.js와 importScripts(offline.js) 모두 HTTP 캐시 없이 업데이트 확인
+    const worker = 'serviceWorker' in navigator
+        ? navigator.serviceWorker.register('/sw.js', { updateViaCache: 'none' }).then(() => navigator.serviceWorker.ready)
+        : Promise.reject(new Error('서비스 워커를 지원하지 않습니다.'));
+    worker
+        .then((registration) => registration.active.postMessage({ type: 'prefetch', stages: stages }))
+        .catch(() => offlineStore.prefetch(stages)); // 서비스 워커를 못 쓰면 페이지에서 직접
+
+    offlineStore.flushResults().catch((error) => console.error('결과 전송 실패:', error));
+    window.addEventListener('online', () => {
+        offlineStore.flushResults().catch((error) => console.error('결과 전송 실패:', error));
+    });
+}
@@ -0,0 +1,192 @@
+// 레이스 모드 클라이언트 (메시지 형식은 race.py 참고)
+class RaceClient {
+    constructor(config) {
+        this.config = config;
+        this.socket = null;
+        this.words = [];
+        this.mySlot = null;
+        this.players = new Map(); // 슬롯 -> {name, completed, missed}
+        this.completed = 0;
+        this.startsAt = 0;
+        this.deadline = 0;
+        this.timer = null;
+        this.finished = false;
+
+        this.statusEl = document.getElementById('raceStatus');
+        this.playersEl = document.getElementById('racePlayers');
+        this.wordsEl = document.getElementById('raceWords');
+        this.input = document.getElementById('raceInput');
+
+        this.input.addEventListener('keydown', (e) => this.handleKey(e));
+    }
+
+    socketUrl() {
+        const base = this.config.url ||
+            `${location.protocol === 'https:' ? 'wss:' : 'ws:'}//${location.host}/ws/race`;
+        return `${base}?stage=${this.config.stage}`;
+    }
+
+    connect() {
+        this.socket = new WebSocket(this.socketUrl());
+        this.socket.addEventListener('message', (e) => this.handleMessage(JSON.parse(e.data)));
+        this.socket.addEventListener('close', (e) => {
+            clearInterval(this.timer);
+            if (this.finished) {
+                return;
+            }
+            const reasons = {4401: '로그인이 필요합니다.', 4403: '잠긴 단계입니다.', 4404: '유효하지 않은 단계입니다.'};
+            this.setStatus(reasons[e.code] || '레이스 서버와 연결이 끊어졌습니다.');
+            this.input.disabled = true;
+        });
+    }
+
+    handleMessage(message) {
+        switch (message[0]) {
+            case 'l': this.onLobby(message[2], message[3]); break;
+            case 's': this.onStart(message[1], message[2], message[3], message[4], message[5]); break;
+            case 't': this.onTick(message[1]); break;
+            case 'e': this.onEnd(message[1]); break;
+        }
+    }
+
+    onLobby(roster, secondsLeft) {
+        this.setRoster(roster);
+        this.setStatus(secondsLeft === null
+            ? `상대를 기다리는 중... (${roster.length}명)`
+            : `${secondsLeft}초 후 시작 (${roster.length}명)`);
+    }
+
+    onStart(words, countdownMs, timeLimit, roster, mySlot) {
+        this.words = words;
+        this.mySlot = mySlot;
+        this.setRoster(roster);
+        this.renderWords();
+        this.startsAt = Date.now() + countdownMs;
+        this.deadline = this.startsAt + timeLimit * 1000;
+
+        this.timer = setInterval(() => {
+            const now = Date.now();
+            if (now < this.startsAt) {
+                this.setStatus(`${Math.ceil((this.startsAt - now) / 1000)}초 후 시작!`);
+                return;
+            }
+            if (this.input.disabled && !this.finished) {
+                this.input.disabled = false;
+                this.input.focus();
+            }
+            this.setStatus(`남은 시간 ${Math.max(0, Math.ceil((this.deadline - now) / 1000))}초`);
+        }, 200);
+    }
+
+    onTick(changes) {
+        for (const [slot, completed, missed] of changes) {
+            const player = this.players.get(slot);
+            if (player) {
+                player.completed = completed;
+                player.missed = missed;
+            }
+        }
+        this.renderPlayers();
+    }
+
+    onEnd(results) {
+        this.finished = true;
+        clearInterval(this.timer);
+        this.input.disabled = true;
+        this.setStatus('레이스 종료');
+
+        const rows = document.getElementById('raceResultRows');
+        rows.innerHTML = '';
+        for (const [slot, name, completed, missed, score, accuracy, rank] of results) {
+            const row = document.createElement('tr');
+            if (slot === this.mySlot) {
+                row.classList.add('table-warning');
+            }
+            for (const value of [rank, name, completed, missed, score, `${accuracy}%`]) {
+                const cell = document.createElement('td');
+                cell.textContent = value;
+                row.appendChild(cell);
+            }
+            rows.appendChild(row);
+        }
+        document.getElementById('raceResults').classList.remove('d-none');
+    }
+
+    handleKey(e) {
+        if (e.key !== ' ' && e.key !== 'Enter') {
+            return;
+        }
+        e.preventDefault();
+        const text = this.input.value.trim();
+        if (!text || this.completed >= this.words.length) {
+            return;
+        }
+        // 판정은 서버가 하고, 화면은 바로 반영
+        this.socket.send(text);
+        if (text === this.words[this.completed]) {
+            this.completed++;
+            this.renderWords();
+            if (this.completed === this.words.length) {
+                this.input.disabled = true;
+                this.setStatus('완주! 다른 참가자를 기다리는 중...');
+            }
+        } else {
+            this.input.classList.add('is-invalid');
+            setTimeout(() => this.input.classList.remove('is-invalid'), 300);
+        }
+        this.input.value = '';
+    }
+
+    setRoster(roster) {
+        this.players = new Map(roster.map(([slot, name]) => [slot, {name, completed: 0, missed: 0}]));
+        this.renderPlayers();
+    }
+
+    renderPlayers() {
+        const total = this.words.length || 1;
+        this.playersEl.innerHTML = '';
+        for (const [slot, player] of this.players) {
+            const row = document.createElement('div');
+            row.className = 'mb-2';
+
+            const label = document.createElement('div');
+            label.className = 'd-flex justify-content-between small';
+            const name = document.createElement('span');
+            name.textContent = slot === this.mySlot ? `${player.name} (나)` : player.name;
+            const count = document.createElement('span');
+            count.textContent = `${player.completed}/${this.words.length} · 오타 ${player.missed}`;
+            label.append(name, count);
+
+            const bar = document.createElement('div');
+            bar.className = 'progress';
+            const fill = document.createElement('div');
+            fill.className = `progress-bar ${slot === this.mySlot ? 'bg-warning' : 'bg-info'}`;
+            fill.style.width = `${player.completed / total * 100}%`;
+            bar.appendChild(fill);
+
+            row.append(label, bar);
+            this.playersEl.appendChild(row);
+        }
+    }
+
+    renderWords() {
+        this.wordsEl.innerHTML = '';
+        this.words.forEach((word, index) => {
+            const span = document.createElement('span');
+            span.className = 'race-word me-2';
+            if (index < this.completed) {
+                span.classList.add('text-success');
+            } else if (index === this.completed) {
+                span.classList.add('fw-bold', 'text-primary');
+            } else {
+                span.classList.add('text-muted');
+            }
+            span.textContent = word;
+            this.wordsEl.appendChild(span);
+        });
+    }
+
+    setStatus(text) {
+        this.statusEl.textContent = text;
+    }
+}
@@ -0,0 +1,31 @@
+// 서비스 워커 (/sw.js로 제공): 단어 번들 미리 받기와 결과 큐 백그라운드 전송
+importScripts('/static/js/offline.js');
+
+self.addEventListener('install', () => {
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', (event) => {
+    event.waitUntil(self.clients.claim());
+});
+
+// 페이지를 떠나도 받기/전송이 끝날 때까지 서비스 워커가 유지됨
+self.addEventListener('message', (event) => {
+    const message = event.data || {};
+    if (message.type === 'prefetch') {
+        event.waitUntil(offlineStore.prefetch(message.stages || []));
+    } else if (message.type === 'flush') {
+        event.waitUntil(offlineStore.flushResults());
+    }
+});
+
+// 연결이 돌아오면 브라우저가 깨워 줌 (Background Sync 지원 브라우저)
+self.addEventListener('sync', (event) => {
+    if (event.tag === RESULT_SYNC_TAG) {
+        event.waitUntil(offlineStore.flushResults().then((data) => {
+            if (data === null || (data && !data.success)) {
+                throw new Error('결과 전송 실패');  // 브라우저가 나중에 다시 시도
+            }
+        }));
+    }
+});
@@ -0,0 +1,132 @@
+"""사용자 진행 통계
+
+UserStageStats는 결과가 저장되는 트랜잭션 안에서 증분 갱신되므로
+대시보드는 세션 수와 관계없이 사용자당 최대 단계 수만큼의 행만 읽는다.
+"""
+import base64
+import os
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, tuple_
+
+from models import db, GameSession, GameSessionDaily, UserStageStats
+
+# 최근 성적 지수이동평균에서 새 결과가 차지하는 비중
+STATS_RECENT_WEIGHT = float(os.environ.get('STATS_RECENT_WEIGHT', 0.2))
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_PAGE_SIZE = 100
+
+
+def apply_results(rows):
+    """저장될 게임 세션 행들로 UserStageStats 갱신 (호출자의 트랜잭션 안에서 실행)"""
+    if not rows:
+        return
+
+    keys = {(row['user_id'], row['stage']) for row in rows}
+    existing = {
+        (stats.user_id, stats.stage): stats
+        for stats in UserStageStats.query.filter(
+            tuple_(UserStageStats.user_id, UserStageStats.stage).in_(keys)
+        ).with_for_update()
+    }
+
+    for row in sorted(rows, key=lambda r: r['created_at']):
+        key = (row['user_id'], row['stage'])
+        stats = existing.get(key)
+        if stats is None:
+            stats = UserStageStats(
+                user_id=row['user_id'], stage=row['stage'], attempts=0,
+                best_score=row['score'], best_accuracy=row['accuracy'],
+                total_score=0, total_accuracy=0.0,
+                recent_score=row['score'], recent_accuracy=row['accuracy'],
+            )
+            db.session.add(stats)
+            existing[key] = stats
+
+        stats.attempts += 1
+        stats.best_score = max(stats.best_score, row['score'])
+        stats.best_accuracy = max(stats.best_accuracy, row['accuracy'])
+        stats.total_score += row['score']
+        stats.total_accuracy += row['accuracy']
+        stats.recent_score += STATS_RECENT_WEIGHT * (row['score'] - stats.recent_score)
+        stats.recent_accuracy += STATS_RECENT_WEIGHT * (row['accuracy'] - stats.recent_accuracy)
+        stats.last_played_at = max(stats.last_played_at or row['created_at'], row['created_at'])
+
+
+def rebuild_user_stage_stats():
+    """게임 세션과 일별 집계(압축된 과거 기록) 전체로 통계를 다시 계산 (최근 평균은 전체 평균으로 대체)"""
+    UserStageStats.query.delete()
+    sources = (
+        db.session.query(
+            GameSession.user_id, GameSession.stage,
+            func.count(GameSession.id), func.max(GameSession.score), func.max(GameSession.accuracy),
+            func.sum(GameSession.score), func.sum(GameSession.accuracy), func.max(GameSession.created_at),
+        ).group_by(GameSession.user_id, GameSession.stage),
+        db.session.query(
+            GameSessionDaily.user_id, GameSessionDaily.stage,
+            func.sum(GameSessionDaily.sessions), func.max(GameSessionDaily.best_score),
+            func.max(GameSessionDaily.best_accuracy), func.sum(GameSessionDaily.total_score),
+            func.sum(GameSessionDaily.total_accuracy), func.max(GameSessionDaily.last_played_at),
+        ).group_by(GameSessionDaily.user_id, GameSessionDaily.stage),
+    )
+
+    merged = {}
+    for aggregates in sources:
+        for user_id, stage, attempts, best_score, best_accuracy, total_score, total_accuracy, last_played in aggregates:
+            row = merged.setdefault((user_id, stage), [0, 0, 0.0, 0, 0.0, None])
+            row[0] += attempts or 0
+            row[1] = max(row[1], best_score or 0)
+            row[2] = max(row[2], best_accuracy or 0.0)
+            row[3] += total_score or 0
+            row[4] += total_accuracy or 0.0
+            if last_played is not None:
+                row[5] = max(row[5] or last_played, last_played)
+
+    for (user_id, stage), (attempts, best_score, best_accuracy, total_score, total_accuracy, last_played) in merged.items():
+        db.session.add(UserStageStats(
+            user_id=user_id, stage=stage, attempts=attempts,
+            best_score=best_score, best_accuracy=best_accuracy,
+            total_score=total_score, total_accuracy=total_accuracy,
+            recent_score=total_score / attempts if attempts else 0.0,
+            recent_accuracy=total_accuracy / attempts if attempts else 0.0,
+            last_played_at=last_played,
+        ))
+    db.session.commit()
+    return len(merged)
+
+
+def user_stage_stats(user_id):
+    """사용자의 단계별 통계 {단계: UserStageStats}"""
+    return {stats.stage: stats for stats in UserStageStats.query.filter_by(user_id=user_id)}
+
+
+def encode_cursor(game_session):
+    raw = f"{game_session.created_at.isoformat()}|{game_session.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """커서를 (created_at, id)로 변환 (형식이 잘못되면 ValueError)"""
+    try:
+        created_at, session_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.fromisoformat(created_at), int(session_id)
+    except (UnicodeError, TypeError, ValueError) as e:
+        raise ValueError('잘못된 커서입니다.') from e
+
+
+def history_page(user_id, stage=None, limit=HISTORY_PAGE_SIZE, cursor=None):
+    """최신순 게임 기록 한 페이지와 다음 페이지 커서 (OFFSET 없이 인덱스 범위 조회)"""
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    query = GameSession.query.filter(GameSession.user_id == user_id)
+    if stage is not None:
+        query = query.filter(GameSession.stage == stage)
+    if cursor:
+        created_at, session_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            GameSession.created_at < created_at,
+            and_(GameSession.created_at == created_at, GameSession.id < session_id),
+        ))
+
+    sessions = query.order_by(GameSession.created_at.desc(), GameSession.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(sessions[limit - 1]) if len(sessions) > limit else None
+    return sessions[:limit], next_cursor
@@ -0,0 +1,298 @@
+"""키 입력 텔레메트리
+
+클라이언트는 게임이 끝날 때 키 입력 이벤트를 압축된 바이너리로 한 번에 보낸다.
+
+    'KS' | 버전(1바이트) | 단계(varint) | 이벤트 수(varint)
+    이벤트마다: 직전 이벤트와의 시간차 ms(varint) | (문자 코드 << 1 | 오타 여부)(varint)
+
+서버는 원본 이벤트를 저장하지 않고 (사용자, 바이그램)마다 고정 크기 지연 시간
+히스토그램과 오타 수만 누적한다. 바이그램은 출력 가능한 ASCII 문자끼리만 만들고
+게임 하나에서 TELEMETRY_MAX_BIGRAMS종류까지만 받는다. 누적분은 메모리에 모았다가
+워커마다 띄우는 백그라운드 스레드가 주기적으로 한 트랜잭션에 병합 저장하므로,
+프로세스가 죽으면 마지막 주기의 텔레메트리는 유실될 수 있다. 병합이 실패하면
+(다른 워커와 충돌 등) 누적분을 되돌려 두고 다음 주기에 다시 시도한다.
+"""
+import atexit
+import os
+import struct
+import threading
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from models import db, KeystrokeStat, insert_ignoring_duplicates
+
+TELEMETRY_MAGIC = b'KS'
+TELEMETRY_VERSION = 1
+TELEMETRY_MAX_BYTES = int(os.environ.get('TELEMETRY_MAX_BYTES', 256 * 1024))
+TELEMETRY_MAX_EVENTS = int(os.environ.get('TELEMETRY_MAX_EVENTS', 20000))
+TELEMETRY_FLUSH_INTERVAL = float(os.environ.get('TELEMETRY_FLUSH_INTERVAL', 10))
+TELEMETRY_MAX_PENDING = int(os.environ.get('TELEMETRY_MAX_PENDING', 50000))
+# 게임 하나에서 받는 바이그램 종류 수 상한 (조작된 업로드가 KeystrokeStat 행을 무한히 만들지 않도록)
+TELEMETRY_MAX_BIGRAMS = int(os.environ.get('TELEMETRY_MAX_BIGRAMS', 500))
+
+# 이 시간보다 긴 간격은 생각하거나 쉬는 시간으로 보고 바이그램 지연에서 제외
+MAX_BIGRAM_GAP_MS = 2000
+
+# 히스토그램 버킷 상한 (ms). 마지막 버킷은 그 이상 전부
+LATENCY_BUCKETS_MS = (25, 50, 75, 100, 125, 150, 200, 250, 300, 400, 500, 700, 1000, 1500, 2000)
+HISTOGRAM_SIZE = len(LATENCY_BUCKETS_MS) + 1
+_HISTOGRAM_STRUCT = struct.Struct(f'<{HISTOGRAM_SIZE}I')
+
+
+class TelemetryError(ValueError):
+    """잘못된 텔레메트리 데이터"""
+
+
+def _read_varint(data, pos):
+    result = 0
+    shift = 0
+    while True:
+        if pos >= len(data):
+            raise TelemetryError('데이터가 중간에 끊겼습니다.')
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+        if shift > 35:
+            raise TelemetryError('varint 값이 너무 큽니다.')
+
+
+def decode_keystrokes(data):
+    """바이너리 업로드를 (단계, [(시간차 ms, 문자, 오타 여부), ...])로 변환"""
+    if len(data) > TELEMETRY_MAX_BYTES:
+        raise TelemetryError('데이터가 너무 큽니다.')
+    if data[:2] != TELEMETRY_MAGIC or len(data) < 3 or data[2] != TELEMETRY_VERSION:
+        raise TelemetryError('지원하지 않는 형식입니다.')
+
+    stage, pos = _read_varint(data, 3)
+    count, pos = _read_varint(data, pos)
+    if count > TELEMETRY_MAX_EVENTS:
+        raise TelemetryError('이벤트가 너무 많습니다.')
+
+    events = []
+    for _ in range(count):
+        delta, pos = _read_varint(data, pos)
+        packed, pos = _read_varint(data, pos)
+        code = packed >> 1
+        if code > 0x10FFFF:
+            raise TelemetryError('잘못된 문자 코드입니다.')
+        events.append((delta, chr(code), bool(packed & 1)))
+    if pos != len(data):
+        raise TelemetryError('데이터 끝에 알 수 없는 바이트가 있습니다.')
+    return stage, events
+
+
+def bucket_index(latency_ms):
+    for index, upper in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms < upper:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+def percentile(histogram, fraction):
+    """히스토그램에서 백분위 지연 추정 (해당 버킷의 상한값)"""
+    total = sum(histogram)
+    if not total:
+        return None
+    threshold = fraction * total
+    running = 0
+    for index, count in enumerate(histogram):
+        running += count
+        if running >= threshold:
+            return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else MAX_BIGRAM_GAP_MS
+    return MAX_BIGRAM_GAP_MS
+
+
+def pack_histogram(histogram):
+    return _HISTOGRAM_STRUCT.pack(*histogram)
+
+
+def unpack_histogram(blob):
+    if not blob:
+        return [0] * HISTOGRAM_SIZE
+    return list(_HISTOGRAM_STRUCT.unpack(blob))
+
+
+class BigramSketch:
+    """바이그램 하나의 고정 크기 누적치"""
+
+    __slots__ = ('histogram', 'count', 'errors', 'latency_total')
+
+    def __init__(self):
+        self.histogram = [0] * HISTOGRAM_SIZE
+        self.count = 0
+        self.errors = 0
+        self.latency_total = 0
+
+    def add(self, latency_ms, error):
+        self.histogram[bucket_index(latency_ms)] += 1
+        self.count += 1
+        self.errors += error
+        self.latency_total += latency_ms
+
+
+def is_bigram_char(char):
+    """바이그램에 쓰는 문자 (출력 가능한 ASCII, 코퍼스 문자 범위)"""
+    return ' ' <= char <= '~'
+
+
+def summarize_session(events, max_bigrams=TELEMETRY_MAX_BIGRAMS):
+    """한 게임의 이벤트로 {바이그램: BigramSketch}와 요약(타수, 분당 단어 수) 계산"""
+    sketches = {}
+    elapsed_ms = 0
+    typed = 0
+    previous = None
+    for delta, char, error in events:
+        elapsed_ms += delta
+        char = char.lower()
+        if not is_bigram_char(char):
+            previous = None
+            continue
+        typed += 1
+        if previous is not None and delta <= MAX_BIGRAM_GAP_MS:
+            bigram = previous + char
+            sketch = sketches.get(bigram)
+            if sketch is None and len(sketches) < max_bigrams:
+                sketch = sketches[bigram] = BigramSketch()
+            if sketch is not None:
+                sketch.add(delta, error)
+        previous = char
+
+    minutes = elapsed_ms / 60000
+    summary = {
+        'keystrokes': typed,
+        'elapsed_ms': elapsed_ms,
+        'wpm': round(typed / 5 / minutes, 1) if minutes > 0 else 0.0,
+    }
+    return sketches, summary
+
+
+class KeystrokeAggregator:
+    """업로드된 게임들의 바이그램 누적치를 메모리에서 합쳐 두었다가 백그라운드 스레드에서 DB에 병합"""
+
+    def __init__(self, app, flush_interval=TELEMETRY_FLUSH_INTERVAL, max_pending=TELEMETRY_MAX_PENDING):
+        self.app = app
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._pending = {}
+        self._flusher = None
+        self._flusher_pid = None
+        self.sessions_recorded = 0
+        atexit.register(self.flush)
+
+    def pending_count(self):
+        return len(self._pending)
+
+    def _ensure_flusher(self):
+        # gunicorn 등에서 fork된 워커는 자기 스레드를 새로 띄워야 함
+        if self._flusher_pid == os.getpid() and self._flusher.is_alive():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid() and self._flusher.is_alive():
+                return
+            self._flusher = threading.Thread(target=self._run, name='keystroke-flush', daemon=True)
+            self._flusher_pid = os.getpid()
+            self._flusher.start()
+
+    def _run(self):
+        while True:
+            # 주기마다, 또는 누적치가 max_pending을 넘으면 바로 병합
+            self._flush_requested.wait(self.flush_interval)
+            self._flush_requested.clear()
+            self.flush()
+
+    def record(self, user_id, events):
+        """한 게임의 이벤트를 누적하고 요약 반환 (DB 병합은 백그라운드 스레드에서)"""
+        self._ensure_flusher()
+        sketches, summary = summarize_session(events)
+        with self._lock:
+            for bigram, sketch in sketches.items():
+                self._merge((user_id, bigram), sketch)
+            self.sessions_recorded += 1
+            if len(self._pending) >= self.max_pending:
+                self._flush_requested.set()
+        return summary
+
+    def _merge(self, key, sketch):
+        # 잠금을 잡은 상태에서 호출
+        pending = self._pending.get(key)
+        if pending is None:
+            self._pending[key] = sketch
+            return
+        pending.histogram = [a + b for a, b in zip(pending.histogram, sketch.histogram)]
+        pending.count += sketch.count
+        pending.errors += sketch.errors
+        pending.latency_total += sketch.latency_total
+
+    def flush(self):
+        """쌓인 누적치를 KeystrokeStat 행에 더해 저장"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return 0
+
+            with self.app.app_context():
+                try:
+                    existing = {}
+                    keys = list(pending)
+                    now = datetime.utcnow()
+                    # 없는 행을 먼저 만들어 두고(다른 워커가 같은 행을 만들어도 충돌하지 않음) 잠근 뒤 더함.
+                    # 쓰기로 트랜잭션을 시작하므로 SQLite에서도 워커끼리 차례로 병합한다
+                    empty = pack_histogram([0] * HISTOGRAM_SIZE)
+                    for start in range(0, len(keys), 100):
+                        db.session.execute(insert_ignoring_duplicates(KeystrokeStat), [
+                            {'user_id': user_id, 'bigram': bigram, 'histogram': empty,
+                             'count': 0, 'errors': 0, 'latency_total': 0, 'updated_at': now}
+                            for user_id, bigram in keys[start:start + 100]
+                        ])
+                    # SQLite 바인드 변수 수 제한을 넘지 않도록 나눠서 조회
+                    for start in range(0, len(keys), 500):
+                        for stat in KeystrokeStat.query.filter(
+                            tuple_(KeystrokeStat.user_id, KeystrokeStat.bigram).in_(keys[start:start + 500])
+                        ).with_for_update():
+                            existing[(stat.user_id, stat.bigram)] = stat
+                    for key, sketch in pending.items():
+                        stat = existing[key]
+                        histogram = unpack_histogram(stat.histogram)
+                        stat.histogram = pack_histogram([a + b for a, b in zip(histogram, sketch.histogram)])
+                        stat.count += sketch.count
+                        stat.errors += sketch.errors
+                        stat.latency_total += sketch.latency_total
+                        stat.updated_at = now
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    # 그 사이 쌓인 누적치와 합쳐 다음 주기에 다시 시도
+                    with self._lock:
+                        for key, sketch in pending.items():
+                            self._merge(key, sketch)
+                    print(f"Keystroke telemetry flush failed ({len(pending)} bigrams requeued): {e}")
+                    return 0
+            return len(pending)
+
+
+def user_key_stats(user_id, limit=20, min_count=5):
+    """사용자의 느리거나 자주 틀리는 바이그램 목록 (평균 지연 내림차순)"""
+    stats = KeystrokeStat.query.filter(
+        KeystrokeStat.user_id == user_id, KeystrokeStat.count >= min_count
+    ).all()
+    rows = []
+    for stat in stats:
+        histogram = unpack_histogram(stat.histogram)
+        rows.append({
+            'bigram': stat.bigram,
+            'count': stat.count,
+            'error_rate': round(stat.errors / stat.count, 3),
+            'mean_ms': round(stat.latency_total / stat.count, 1),
+            'p50_ms': percentile(histogram, 0.5),
+            'p90_ms': percentile(histogram, 0.9),
+        })
+    rows.sort(key=lambda row: row['mean_ms'], reverse=True)
+    return rows[:limit]
@@ -0,0 +1,137 @@
+"""단계별 단어 번들 사전 생성 및 캐시 가능한 응답 처리"""
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:  # brotli는 선택 의존성
+    brotli = None
+
+# 번들 설정 (환경 변수로 조정 가능)
+BUNDLE_COUNT = int(os.environ.get('WORD_BUNDLE_COUNT', 32))
+BUNDLE_SIZE = int(os.environ.get('WORD_BUNDLE_SIZE', 10))
+BUNDLE_MAX_AGE = int(os.environ.get('WORD_BUNDLE_MAX_AGE', 86400))
+
+
+def _json_bytes(data):
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def bundle_version(stage_config, corpus_version):
+    """단계 설정과 코퍼스 버전으로부터 번들 버전 해시 계산"""
+    digest = hashlib.sha256(_json_bytes({'stages': stage_config, 'corpus': corpus_version}))
+    return digest.hexdigest()[:12]
+
+
+class WordBundle:
+    """직렬화/압축이 끝난 단어 번들 하나"""
+
+    __slots__ = ('stage', 'bundle_id', 'body', 'gzip_body', 'br_body', 'etag')
+
+    def __init__(self, stage, bundle_id, payload):
+        self.stage = stage
+        self.bundle_id = bundle_id
+        self.body = _json_bytes(payload)
+        # mtime=0으로 고정해 모든 워커에서 동일한 바이트(= 동일한 ETag)가 나오도록 함
+        self.gzip_body = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.br_body = brotli.compress(self.body) if brotli else None
+        self.etag = hashlib.sha256(self.body).hexdigest()[:32]
+
+    def representation(self, accept_encodings):
+        """Accept-Encoding에 맞는 (본문, Content-Encoding, ETag) 선택"""
+        if self.br_body is not None and accept_encodings['br']:
+            return self.br_body, 'br', f'{self.etag}-br'
+        if accept_encodings['gzip']:
+            return self.gzip_body, 'gzip', f'{self.etag}-gz'
+        return self.body, None, self.etag
+
+
+class WordBundleStore:
+    """단계별로 고정된 번들 풀을 만들어 두고 ID로 제공 (처음 refresh() 때 생성)"""
+
+    def __init__(self, stage_config, corpus, bundle_count=BUNDLE_COUNT, bundle_size=BUNDLE_SIZE):
+        self.stage_config = stage_config
+        self.corpus = corpus
+        self.bundle_count = bundle_count
+        self.bundle_size = bundle_size
+        self.version = None
+        self.corpus_version = None
+        self.bundles = {}
+        self._lock = threading.Lock()
+
+    def build(self):
+        """모든 단계의 번들을 다시 생성"""
+        corpus_version = self.corpus.version
+        version = bundle_version(self.stage_config, corpus_version)
+        bundles = {}
+        for stage, config in self.stage_config.items():
+            # 버전+단계로 시드를 고정해 여러 워커/재시작 간에도 같은 번들이 만들어짐
+            rng = random.Random(f'{version}:{stage}')
+            bundles[stage] = [
+                WordBundle(stage, bundle_id, {
+                    'bundle_id': bundle_id,
+                    'config': config,
+                    'version': version,
+                    'words': self.corpus.sample(config['word_type'], self.bundle_size, rng),
+                })
+                for bundle_id in range(self.bundle_count)
+            ]
+        self.bundles = bundles
+        self.version = version
+        self.corpus_version = corpus_version
+
+    def refresh(self):
+        """아직 만들지 않았거나 코퍼스 파일이 교체되었으면 번들을 (다시) 생성"""
+        if self.corpus.maybe_reload() or self.corpus.version != self.corpus_version:
+            with self._lock:
+                if self.corpus.version != self.corpus_version:
+                    self.build()
+
+    def get(self, stage, bundle_id):
+        stage_bundles = self.bundles.get(stage)
+        if stage_bundles is None or not 0 <= bundle_id < len(stage_bundles):
+            return None
+        return stage_bundles[bundle_id]
+
+    def random_bundle(self, stage):
+        stage_bundles = self.bundles.get(stage)
+        if not stage_bundles:
+            return None
+        return random.choice(stage_bundles)
+
+    def manifest(self, stage):
+        """클라이언트가 무작위 번들을 고를 때 필요한 정보"""
+        return {
+            'stage': stage,
+            'bundle_count': len(self.bundles.get(stage, ())),
+            'version': self.version,
+        }
+
+
+def make_bundle_response(bundle, cacheable=True):
+    """번들을 ETag/Cache-Control 헤더와 함께 응답으로 변환"""
+    body, encoding, etag = bundle.representation(request.accept_encodings)
+    response = current_app.response_class(mimetype='application/json')
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+
+    if cacheable:
+        response.cache_control.public = True
+        response.cache_control.max_age = BUNDLE_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.set_data(body)
+    return response